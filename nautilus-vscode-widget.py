@@ -11,17 +11,27 @@ VERSION = "3.3.8"
 import gi
 gi.require_version('Gtk', '3.0')
 gi.require_version('Gdk', '3.0')
-from gi.repository import Gtk, Gdk, GLib, GdkPixbuf
+from gi.repository import Gtk, Gdk, Gio, GLib, GdkPixbuf
 import cairo
 import subprocess
 import os
 import re
 import json
 import time
+import atexit
+import queue
 import logging
+import logging.handlers
 import sys
+import stat
 import shutil
+import signal
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache, wraps
+from urllib.parse import unquote
 
 # Importaciones opcionales según el entorno
 try:
@@ -31,6 +41,528 @@ try:
 except ImportError:
     XLIB_AVAILABLE = False
 
+# Parser/serializador JSON en C si está disponible (la configuración se lee y escribe en bytes)
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj):
+        return json.dumps(obj, indent=2).encode('utf-8')
+
+# Directorio personal resuelto una sola vez (evita consultar pwd en cada llamada)
+_USER_HOME = os.path.expanduser('~')
+
+# Directorios por defecto si no se detecta ninguna carpeta, en orden de preferencia
+_FALLBACK_DIRS = tuple(
+    os.path.join(_USER_HOME, name) for name in ('Desktop', 'Escritorio', 'Documents', 'Documentos')
+) + (_USER_HOME,)
+
+# Títulos de ventana que corresponden a la carpeta personal
+_HOME_TITLES = frozenset(('carpeta personal', 'home', 'personal folder'))
+
+# Títulos que nunca corresponden a una carpeta: no merece la pena buscarlos en disco
+_IGNORED_TITLES = frozenset((
+    'org.gnome.nautilus', 'nautilus', 'loading…', 'loading...', 'cargando…', 'cargando...',
+    'new tab', 'nueva pestaña', 'other locations', 'otras ubicaciones', 'recent', 'recientes',
+    'starred', 'destacados', 'trash', 'papelera'
+))
+
+# Carpetas XDG conocidas: (clave de user-dirs.dirs, nombre por defecto, títulos en inglés/español)
+_XDG_FOLDERS = (
+    ('DOCUMENTS', 'Documents', ('documents', 'documentos')),
+    ('DOWNLOAD', 'Downloads', ('downloads', 'descargas')),
+    ('PICTURES', 'Pictures', ('pictures', 'imágenes')),
+    ('MUSIC', 'Music', ('music', 'música')),
+    ('VIDEOS', 'Videos', ('videos', 'vídeos')),
+    ('DESKTOP', 'Desktop', ('desktop', 'escritorio')),
+    ('PUBLICSHARE', 'Public', ('public', 'público')),
+    ('TEMPLATES', 'Templates', ('templates', 'plantillas')),
+)
+
+# Dónde buscar una carpeta por nombre (solo los que existen, resuelto una vez);
+# la búsqueda profunda se limita a home, Documents y Documentos
+_SEARCH_DIRS = tuple(
+    path for path in (_USER_HOME,) + tuple(
+        os.path.join(_USER_HOME, name)
+        for name in ('Documents', 'Documentos', 'Desktop', 'Escritorio', 'Downloads', 'Descargas')
+    )
+    if os.path.isdir(path)
+)
+_DEEP_SEARCH_DIRS = tuple(
+    path for path in _SEARCH_DIRS
+    if path in (_USER_HOME, os.path.join(_USER_HOME, 'Documents'), os.path.join(_USER_HOME, 'Documentos'))
+)
+
+# Directorios que no se recorren al buscar una carpeta por nombre
+_EXCLUDED_SEARCH_DIRS = frozenset(('node_modules', '__pycache__', '.git'))
+
+# Nombres de colores CSS básicos aceptados en la configuración
+_BASIC_COLORS = frozenset((
+    'black', 'white', 'red', 'green', 'blue', 'yellow', 'cyan', 'magenta',
+    'gray', 'grey', 'orange', 'purple', 'pink', 'brown'
+))
+
+# Colores hexadecimales aceptados: #rgb, #rrggbb o #rrggbbaa
+_HEX_COLOR_RE = re.compile(r'#[0-9a-fA-F]{3}(?:[0-9a-fA-F]{3}(?:[0-9a-fA-F]{2})?)?')
+
+# Nombres de carpetas XDG que delatan un título de ventana de Nautilus (una sola pasada)
+_XDG_FOLDER_TITLE_RE = re.compile(
+    '|'.join(map(re.escape, (
+        'documents', 'documentos', 'downloads', 'descargas', 'pictures', 'imágenes',
+        'music', 'música', 'videos', 'vídeos', 'desktop', 'escritorio'
+    ))),
+    re.IGNORECASE
+)
+
+# Extracción de rutas de títulos de ventana, salida de gdbus y propiedades X
+_TITLE_PATH_RE = re.compile(r'(/[^\s]+(?:/[^\s]*)*?)')
+_PROP_FILE_RE = re.compile(r'["\']([^"\']*file://[^"\']*)["\']')
+_PROP_PATH_RE = re.compile(r'["\']([^"\']*(?:/[^/"\'\s]+)+)["\']')
+
+# Comandos comunes para VSCode, en orden de preferencia
+_COMMON_EDITOR_COMMANDS = (
+    'code',
+    'code-insiders',
+    'codium',
+    'vscodium',
+    '/usr/bin/code',
+    '/usr/local/bin/code',
+    '/snap/bin/code',
+    '/var/lib/flatpak/app/com.visualstudio.code/current/active/export/bin/com.visualstudio.code',
+    '/opt/visual-studio-code/bin/code',
+    f"{_USER_HOME}/.local/bin/code"
+)
+
+# CSS global estático (ventana, botón principal, botón + y favoritos por defecto); se carga una vez
+_MAIN_CSS = """
+        /* Ventana del widget principal */
+        #floating-button {
+            background-color: rgba(0, 0, 0, 0);
+            background: transparent;
+        }
+
+        /* Contenedor de favoritos con fondo personalizable */
+        #favorites-container {
+            background: rgba(40, 40, 45, 0.95);
+            border-radius: 12px;
+            border: 1px solid rgba(255, 255, 255, 0.15);
+        }
+
+        /* Botón principal - simple sin sombras */
+        #floating-button button {
+            border-radius: 20px;
+            background: alpha(@main_button_color, 0.95);
+            color: white;
+            border: 2px solid rgba(255, 255, 255, 0.25);
+            transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+            padding: 0;
+            margin: 0;
+            min-width: 36px;
+            min-height: 36px;
+        }
+
+        #floating-button button * {
+            padding: 0;
+            margin: 0;
+        }
+
+        #floating-button button:hover {
+            background: @main_button_color;
+            border: 2px solid rgba(255, 255, 255, 0.35);
+        }
+
+        #floating-button button:active {
+            background: alpha(@main_button_color, 0.85);
+        }
+
+        /* Botón + de añadir favoritos - simple sin sombras */
+        #add-fav-button {
+            border-radius: 12px;
+            background: rgba(60, 60, 65, 0.85);
+            color: white;
+            border: 1px solid rgba(255, 255, 255, 0.15);
+            transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+            padding: 0;
+            margin: 0;
+            opacity: 0.85;
+        }
+
+        #add-fav-button label {
+            padding: 0;
+            margin: 0;
+            min-width: 0;
+            min-height: 0;
+        }
+
+        #add-fav-button:hover {
+            background: rgba(80, 80, 85, 0.95);
+            border: 1px solid rgba(255, 255, 255, 0.25);
+            opacity: 1.0;
+        }
+
+        #add-fav-button:active {
+            background: rgba(50, 50, 55, 0.8);
+            opacity: 0.9;
+        }
+
+        /* Botones de carpetas favoritas por defecto - sin sombras */
+        #fav-button {
+            border-radius: 12px;
+            background: rgba(30, 30, 35, 0.95);
+            color: white;
+            border: 1px solid rgba(255, 255, 255, 0.2);
+            transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+            padding: 0;
+            margin: 0;
+        }
+
+        #fav-button label {
+            padding: 0;
+            margin: 0;
+            min-width: 0;
+            min-height: 0;
+        }
+
+        #fav-button:hover {
+            background: rgba(40, 40, 45, 1.0);
+            border: 1px solid rgba(255, 255, 255, 0.3);
+        }
+
+        #fav-button:active {
+            background: rgba(25, 25, 30, 0.85);
+        }
+        """
+
+# Color del botón principal: único fragmento que se recarga al cambiar el tema
+_MAIN_COLOR_CSS_TMPL = "@define-color main_button_color rgb({r}, {g}, {b});"
+
+# CSS del diálogo de configuración (bytes listos para load_from_data)
+_DIALOG_CSS = b"""
+        dialog {
+            background: rgba(50, 50, 55, 0.98);
+            border-radius: 12px;
+            border: 1px solid rgba(255, 255, 255, 0.1);
+            box-shadow: 0 10px 40px rgba(0, 0, 0, 0.5);
+        }
+
+        dialog headerbar {
+            background: rgba(60, 60, 65, 0.98);
+            border-radius: 12px 12px 0 0;
+            color: white;
+        }
+
+        dialog headerbar label {
+            color: white;
+        }
+
+        dialog box {
+            background: transparent;
+        }
+
+        dialog entry {
+            border-radius: 6px;
+            padding: 8px;
+            background: rgba(70, 70, 75, 0.9);
+            color: white;
+            border: 1px solid rgba(255, 255, 255, 0.2);
+        }
+
+        dialog entry:focus {
+            border: 1px solid rgba(100, 150, 255, 0.6);
+            box-shadow: 0 0 0 3px rgba(100, 150, 255, 0.2);
+            background: rgba(80, 80, 85, 0.95);
+        }
+
+        dialog button {
+            border-radius: 6px;
+            padding: 8px 16px;
+            background: rgba(70, 70, 75, 0.9);
+            color: white;
+            border: 1px solid rgba(255, 255, 255, 0.2);
+        }
+
+        dialog button:hover {
+            background: rgba(90, 90, 95, 0.95);
+            border: 1px solid rgba(255, 255, 255, 0.3);
+        }
+
+        dialog label {
+            color: #ffffff;
+        }
+
+        dialog switch {
+            background: rgba(70, 70, 75, 0.9);
+        }
+
+        dialog switch:checked {
+            background: rgba(100, 150, 255, 0.8);
+        }
+        """
+
+# Plantilla CSS de cada botón favorito (se carga en el provider propio del botón)
+_FAV_CSS_TMPL = """
+            /* Botón favorito para {name} */
+            #fav-button-{i} {{
+                border-radius: 12px;
+                background: rgba({r}, {g}, {b}, 0.95);
+                color: white;
+                border: 1px solid rgba(255, 255, 255, 0.2);
+                transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+                padding: 0;
+                margin: 0;
+            }}
+
+        #fav-button-{i}:hover {{
+            background: rgba({r}, {g}, {b}, 1.0);
+            border: 1px solid rgba(255, 255, 255, 0.3);
+        }}
+
+        #fav-button-{i}:active {{
+            background: rgba({r}, {g}, {b}, 0.85);
+        }}
+            """
+
+
+# Plantilla del diálogo de configuración (se parsea con Gtk.Builder al abrirlo)
+_SETTINGS_UI = """<?xml version="1.0" encoding="UTF-8"?>
+<interface>
+  <requires lib="gtk+" version="3.20"/>
+  <object class="GtkDialog" id="dialog">
+    <property name="title">Configuración - VSCode Widget</property>
+    <property name="default_width">400</property>
+    <property name="default_height">300</property>
+    <property name="border_width">10</property>
+    <child internal-child="vbox">
+      <object class="GtkBox" id="content_box">
+        <property name="spacing">10</property>
+        <child>
+          <object class="GtkLabel">
+            <property name="label">&lt;span font="14" weight="bold"&gt;⚙️ Configuración&lt;/span&gt;</property>
+            <property name="use_markup">True</property>
+          </object>
+          <packing>
+            <property name="expand">False</property>
+            <property name="fill">False</property>
+            <property name="padding">10</property>
+          </packing>
+        </child>
+        <child>
+          <object class="GtkBox">
+            <property name="orientation">horizontal</property>
+            <property name="spacing">5</property>
+            <child>
+              <object class="GtkLabel">
+                <property name="label">Comando del editor:</property>
+                <property name="width_chars">20</property>
+                <property name="xalign">0</property>
+              </object>
+              <packing>
+                <property name="expand">False</property>
+                <property name="fill">False</property>
+              </packing>
+            </child>
+            <child>
+              <object class="GtkEntry" id="editor_entry">
+                <property name="placeholder_text">code, /usr/bin/code, etc.</property>
+              </object>
+              <packing>
+                <property name="expand">True</property>
+                <property name="fill">True</property>
+              </packing>
+            </child>
+            <child>
+              <object class="GtkButton" id="browse_button">
+                <property name="label">📁</property>
+                <property name="tooltip_text">Seleccionar ejecutable</property>
+              </object>
+              <packing>
+                <property name="expand">False</property>
+                <property name="fill">False</property>
+              </packing>
+            </child>
+          </object>
+          <packing>
+            <property name="expand">False</property>
+            <property name="fill">False</property>
+          </packing>
+        </child>
+        <child>
+          <object class="GtkLabel">
+            <property name="label">&lt;span font="8" style="italic"&gt;💡 Usa "code" o la ruta completa como "/usr/bin/code"&lt;/span&gt;</property>
+            <property name="use_markup">True</property>
+            <property name="xalign">0</property>
+            <property name="margin_start">20</property>
+          </object>
+          <packing>
+            <property name="expand">False</property>
+            <property name="fill">False</property>
+          </packing>
+        </child>
+        <child>
+          <object class="GtkBox">
+            <property name="orientation">horizontal</property>
+            <property name="spacing">10</property>
+            <child>
+              <object class="GtkLabel">
+                <property name="label">Color del botón:</property>
+                <property name="width_chars">20</property>
+                <property name="xalign">0</property>
+              </object>
+              <packing>
+                <property name="expand">False</property>
+                <property name="fill">False</property>
+              </packing>
+            </child>
+            <child>
+              <object class="GtkColorButton" id="color_button"/>
+              <packing>
+                <property name="expand">False</property>
+                <property name="fill">False</property>
+              </packing>
+            </child>
+          </object>
+          <packing>
+            <property name="expand">False</property>
+            <property name="fill">False</property>
+          </packing>
+        </child>
+        <child>
+          <object class="GtkBox">
+            <property name="orientation">horizontal</property>
+            <property name="spacing">10</property>
+            <child>
+              <object class="GtkLabel">
+                <property name="label">Mostrar etiqueta:</property>
+                <property name="width_chars">20</property>
+                <property name="xalign">0</property>
+              </object>
+              <packing>
+                <property name="expand">False</property>
+                <property name="fill">False</property>
+              </packing>
+            </child>
+            <child>
+              <object class="GtkSwitch" id="show_label_switch"/>
+              <packing>
+                <property name="expand">False</property>
+                <property name="fill">False</property>
+              </packing>
+            </child>
+          </object>
+          <packing>
+            <property name="expand">False</property>
+            <property name="fill">False</property>
+          </packing>
+        </child>
+        <child>
+          <object class="GtkBox">
+            <property name="orientation">horizontal</property>
+            <property name="spacing">10</property>
+            <child>
+              <object class="GtkLabel">
+                <property name="label">Iniciar con el sistema:</property>
+                <property name="width_chars">20</property>
+                <property name="xalign">0</property>
+              </object>
+              <packing>
+                <property name="expand">False</property>
+                <property name="fill">False</property>
+              </packing>
+            </child>
+            <child>
+              <object class="GtkSwitch" id="autostart_switch"/>
+              <packing>
+                <property name="expand">False</property>
+                <property name="fill">False</property>
+              </packing>
+            </child>
+          </object>
+          <packing>
+            <property name="expand">False</property>
+            <property name="fill">False</property>
+          </packing>
+        </child>
+        <child>
+          <object class="GtkLabel">
+            <property name="label">&lt;span font="8" style="italic"&gt;💡 El botón aparecerá automáticamente al iniciar sesión&lt;/span&gt;</property>
+            <property name="use_markup">True</property>
+            <property name="xalign">0</property>
+            <property name="margin_start">20</property>
+          </object>
+          <packing>
+            <property name="expand">False</property>
+            <property name="fill">False</property>
+          </packing>
+        </child>
+        <child>
+          <object class="GtkLabel">
+            <property name="label">&lt;span font="9" style="italic"&gt;💡 Puedes arrastrar el botón flotante
+para moverlo a cualquier posición&lt;/span&gt;</property>
+            <property name="use_markup">True</property>
+            <property name="margin_top">20</property>
+          </object>
+          <packing>
+            <property name="expand">False</property>
+            <property name="fill">False</property>
+          </packing>
+        </child>
+        <child>
+          <object class="GtkBox">
+            <property name="orientation">vertical</property>
+            <property name="spacing">2</property>
+            <property name="margin_top">20</property>
+            <child>
+              <object class="GtkLabel" id="version_label">
+                <property name="use_markup">True</property>
+                <property name="xalign">0.5</property>
+              </object>
+              <packing>
+                <property name="expand">False</property>
+                <property name="fill">False</property>
+              </packing>
+            </child>
+            <child>
+              <object class="GtkLabel">
+                <property name="label">&lt;span font="7" foreground="#888888"&gt;Realizado por Konstantin WDK&lt;/span&gt;</property>
+                <property name="use_markup">True</property>
+                <property name="xalign">0.5</property>
+              </object>
+              <packing>
+                <property name="expand">False</property>
+                <property name="fill">False</property>
+              </packing>
+            </child>
+            <child>
+              <object class="GtkLinkButton">
+                <property name="label">webdesignerk.com</property>
+                <property name="uri">https://webdesignerk.com</property>
+                <property name="relief">none</property>
+                <property name="halign">center</property>
+              </object>
+              <packing>
+                <property name="expand">False</property>
+                <property name="fill">False</property>
+              </packing>
+            </child>
+          </object>
+          <packing>
+            <property name="expand">False</property>
+            <property name="fill">False</property>
+            <property name="pack_type">end</property>
+          </packing>
+        </child>
+      </object>
+    </child>
+  </object>
+</interface>
+"""
+
 
 class SubprocessCache:
     """Cache para resultados de subprocess con TTL mejorado"""
@@ -76,27 +608,249 @@ class SubprocessCache:
         self.cache.clear()
 
 
+class FastRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler que evita consultar la ruta del log en cada registro"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._is_regular_file = None
+
+    def shouldRollover(self, record):
+        """Decidir la rotación usando solo la posición del stream ya abierto"""
+        if self.stream is None:
+            self.stream = self._open()
+        if self.maxBytes <= 0:
+            return False
+
+        msg = "%s\n" % self.format(record)
+        if self.stream.tell() + len(msg) < self.maxBytes:
+            return False
+
+        # Solo rotar ficheros regulares (no /dev/null, pipes...); se comprueba una vez
+        if self._is_regular_file is None:
+            self._is_regular_file = stat.S_ISREG(os.fstat(self.stream.fileno()).st_mode)
+        return self._is_regular_file
+
+
+def _cache_found(func):
+    """Cachear solo resultados encontrados: un None se vuelve a comprobar (p. ej. editor instalado después)"""
+    cache = {}
+
+    @wraps(func)
+    def wrapper(arg):
+        try:
+            return cache[arg]
+        except KeyError:
+            pass
+        result = func(arg)
+        if result is not None:
+            cache[arg] = result
+        return result
+
+    wrapper.cache_clear = cache.clear
+    return wrapper
+
+
+@_cache_found
+def _which(name):
+    """Resolver un comando en PATH (cacheados solo los encontrados)"""
+    return shutil.which(name)
+
+
+@lru_cache(maxsize=1)
+def _get_xlib_display():
+    """Conexión Xlib compartida (None si no hay Xlib o servidor X)"""
+    if not XLIB_AVAILABLE:
+        return None
+    try:
+        return display.Display()
+    except Exception:
+        return None
+
+
+def _x_active_window():
+    """Ventana activa según _NET_ACTIVE_WINDOW (None si no se puede determinar)"""
+    xdisplay = _get_xlib_display()
+    root = xdisplay.screen().root
+    prop = root.get_full_property(xdisplay.intern_atom('_NET_ACTIVE_WINDOW'), X.AnyPropertyType)
+    if not prop or not prop.value or not prop.value[0]:
+        return None
+    return xdisplay.create_resource_object('window', prop.value[0])
+
+
+def _x_window_names(window):
+    """Títulos (_NET_WM_NAME, WM_NAME) de una ventana X, leídos sin lanzar xprop"""
+    xdisplay = _get_xlib_display()
+    prop = window.get_full_property(xdisplay.intern_atom('_NET_WM_NAME'),
+                                    xdisplay.intern_atom('UTF8_STRING'))
+    net_name = prop.value.decode('utf-8', 'replace') if prop and prop.value else None
+    wm_name = window.get_wm_name()
+    if isinstance(wm_name, bytes):
+        wm_name = wm_name.decode('latin-1')
+    return net_name, wm_name
+
+
+def _read_xdg_user_dirs():
+    """Leer las rutas de ~/.config/user-dirs.dirs (sin lanzar xdg-user-dir)"""
+    user_dirs = {}
+    config_home = os.environ.get('XDG_CONFIG_HOME') or os.path.join(_USER_HOME, '.config')
+    try:
+        with open(os.path.join(config_home, 'user-dirs.dirs'), encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                # Formato: XDG_DOCUMENTS_DIR="$HOME/Documentos"
+                if not line.startswith('XDG_') or '=' not in line:
+                    continue
+                key, value = line.split('=', 1)
+                user_dirs[key[4:-4]] = value.strip().strip('"').replace('$HOME', _USER_HOME)
+    except OSError:
+        pass
+    return user_dirs
+
+
+def _build_folder_map():
+    """Mapear títulos de carpeta (en minúsculas) a rutas existentes, una vez al arrancar"""
+    user_dirs = _read_xdg_user_dirs()
+    home = os.path.normpath(_USER_HOME)
+    folder_map = {}
+    for key, default_name, titles in _XDG_FOLDERS:
+        # Preferir la ruta XDG (localizada); si no existe, la carpeta en inglés bajo home
+        for path in (user_dirs.get(key), os.path.join(_USER_HOME, default_name)):
+            if not path:
+                continue
+            path = os.path.normpath(path)
+            # xdg-user-dirs desactiva una carpeta apuntándola a "$HOME/": no mapear home
+            basename = os.path.basename(path).strip().lower()
+            if path == home or not basename or not os.path.isdir(path):
+                continue
+            for title in titles + (basename,):
+                if title.strip():
+                    folder_map.setdefault(title, path)
+            break
+    return folder_map
+
+
+# Títulos de carpetas XDG -> ruta, resuelto una sola vez
+_FOLDER_MAP = _build_folder_map()
+
+
+def _find_folder_bfs(base_dir, target_folded, max_depth=2):
+    """Buscar una carpeta por nombre (ya en casefold) en anchura hasta max_depth niveles"""
+    deadline = time.monotonic() + 2.0
+    pending = deque([(base_dir, 0)])
+
+    while pending:
+        # Límite de tiempo comprobado una vez por directorio, no por entrada
+        if time.monotonic() > deadline:
+            break
+        directory, depth = pending.popleft()
+
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    # Check if this item matches our target
+                    matches = name.casefold() == target_folded
+                    # Skip hidden directories and common system directories
+                    descend = (depth + 1 < max_depth and
+                               not name.startswith('.') and
+                               name not in _EXCLUDED_SEARCH_DIRS)
+                    # Filtrar por nombre antes de is_dir(): con d_type desconocido hace un stat
+                    if not (matches or descend):
+                        continue
+                    try:
+                        if not entry.is_dir():
+                            continue
+                    except OSError:
+                        continue
+
+                    if matches:
+                        return entry.path
+
+                    # No seguir enlaces simbólicos
+                    if not entry.is_symlink():
+                        pending.append((entry.path, depth + 1))
+        except OSError:
+            continue
+
+    return None
+
+
+@lru_cache(maxsize=1)
+def _get_search_pool():
+    """Pool de hilos compartido para leer las ubicaciones de búsqueda en paralelo"""
+    return ThreadPoolExecutor(max_workers=max(1, len(_SEARCH_DIRS)),
+                              thread_name_prefix='folder-search')
+
+
+def _scan_for_name(base_dir, target_folded):
+    """Buscar una subcarpeta directa de base_dir cuyo nombre (en casefold) coincida"""
+    try:
+        with os.scandir(base_dir) as entries:
+            for entry in entries:
+                # El tipo viene de readdir: sin stat extra salvo para enlaces simbólicos
+                if entry.name.casefold() == target_folded and entry.is_dir():
+                    return entry.path
+    except OSError:
+        pass
+    return None
+
+
+@lru_cache(maxsize=256)
+def _search_folder(target_folded):
+    """Buscar una carpeta por nombre en las ubicaciones habituales (cacheado, también los fallos)"""
+    # First try direct subdirectories: todas las ubicaciones a la vez, respetando su prioridad
+    pool = _get_search_pool()
+    futures = [pool.submit(_scan_for_name, base_dir, target_folded) for base_dir in _SEARCH_DIRS]
+    for future in futures:
+        found = future.result()
+        if found:
+            for pending in futures:
+                pending.cancel()
+            return found
+
+    # Nombres con extensión o demasiado largos: casi seguro no son carpetas, no recorrer
+    if '.' in target_folded or len(target_folded) > 128:
+        return None
+
+    # Then try deeper search (max 2 levels)
+    for base_dir in _DEEP_SEARCH_DIRS:  # Only search in home, Documents, Documentos
+        found = _find_folder_bfs(base_dir, target_folded, max_depth=2)
+        if found:
+            return found
+
+    return None
+
+
+@lru_cache(maxsize=1)
 def detect_environment():
-    """Detectar entorno de ejecución y herramientas disponibles"""
+    """Detectar entorno de ejecución y herramientas disponibles (una vez por proceso)"""
+    environ = os.environ
+    # Detectar Wayland
+    is_wayland = bool(environ.get('WAYLAND_DISPLAY')) or environ.get('XDG_SESSION_TYPE') == 'wayland'
+
     env_info = {
-        'display_server': 'x11',  # Default
-        'desktop': os.environ.get('XDG_CURRENT_DESKTOP', '').lower(),
-        'has_xdotool': shutil.which('xdotool') is not None,
-        'has_wmctrl': shutil.which('wmctrl') is not None,
-        'has_xprop': shutil.which('xprop') is not None,
-        'has_gdbus': shutil.which('gdbus') is not None,
+        'display_server': 'wayland' if is_wayland else 'x11',
+        'desktop': environ.get('XDG_CURRENT_DESKTOP', '').lower(),
+        'has_xdotool': _which('xdotool') is not None,
+        'has_wmctrl': _which('wmctrl') is not None,
+        'has_xprop': _which('xprop') is not None,
+        'has_gdbus': _which('gdbus') is not None,
         'xlib_available': XLIB_AVAILABLE,
     }
 
-    # Detectar Wayland
-    if os.environ.get('WAYLAND_DISPLAY'):
-        env_info['display_server'] = 'wayland'
-    elif os.environ.get('XDG_SESSION_TYPE') == 'wayland':
-        env_info['display_server'] = 'wayland'
-
     return env_info
 
 
+def _is_executable_file(path):
+    """Comprobar con un único stat que la ruta sea un fichero regular ejecutable"""
+    try:
+        st = os.stat(path)
+    except (OSError, ValueError):
+        return False
+    return stat.S_ISREG(st.st_mode) and bool(st.st_mode & 0o111)
+
+
+@_cache_found
 def validate_editor_command(cmd):
     """Validar que un comando de editor sea seguro y ejecutable"""
     if not cmd or not isinstance(cmd, str):
@@ -107,13 +861,13 @@ def validate_editor_command(cmd):
 
     # Verificar si es una ruta absoluta
     if os.path.isabs(cmd):
-        if os.path.isfile(cmd) and os.access(cmd, os.X_OK):
+        if _is_executable_file(cmd):
             return cmd
         return None
 
     # Buscar en PATH
-    cmd_path = shutil.which(cmd)
-    if cmd_path and os.access(cmd_path, os.X_OK):
+    cmd_path = _which(cmd)
+    if cmd_path and _is_executable_file(cmd_path):
         return cmd_path
 
     return None
@@ -141,16 +895,111 @@ def validate_directory(path):
         return None
 
 
+def _is_dir(path):
+    """Comprobar con un único stat que la ruta existe y es un directorio"""
+    try:
+        return stat.S_ISDIR(os.stat(path).st_mode)
+    except (OSError, ValueError):
+        return False
+
+
 def is_valid_directory(path):
     """Helper rápido para verificar si una ruta es un directorio válido"""
-    return path and os.path.exists(path) and os.path.isdir(path)
+    return path and os.path.isdir(path)
 
 
+@lru_cache(maxsize=256)
+def is_valid_color(color_str):
+    """Validate color string format (el llamador garantiza que es str)"""
+    # Validar formato hexadecimal (#rgb, #rrggbb, #rrggbbaa)
+    if color_str.startswith('#'):
+        return _HEX_COLOR_RE.fullmatch(color_str) is not None
+    
+    # Validar nombres de colores CSS básicos
+    return color_str.lower() in _BASIC_COLORS
+
+
+@lru_cache(maxsize=128)
+def _hex_to_rgb(color):
+    """Convertir '#rrggbb' (o '#rgb') en una tupla (r, g, b)"""
+    hex_color = color.lstrip('#')
+    if len(hex_color) == 3:
+        hex_color = ''.join(c * 2 for c in hex_color)
+    r, g, b = bytes.fromhex(hex_color[:6])
+    return r, g, b
+
+
+def _rgba_to_hex(rgba):
+    """Convertir un Gdk.RGBA en '#rrggbb' (canales fuera de gama recortados a 0..255)"""
+    r = min(255, max(0, int(rgba.red * 255)))
+    g = min(255, max(0, int(rgba.green * 255)))
+    b = min(255, max(0, int(rgba.blue * 255)))
+    return '#{:06x}'.format((r << 16) | (g << 8) | b)
+
+
+def _is_valid_position(value):
+    """Posiciones dentro de un rango razonable"""
+    return -10000 <= value <= 10000
+
+
+def _is_str_list(value):
+    """Listas cuyos elementos son todos strings (JSON no produce subclases de str)"""
+    return all(type(item) is str for item in value)
+
+
+def _is_str_dict(value):
+    """Diccionarios con claves y valores string"""
+    return all(type(k) is str and type(v) is str for k, v in value.items())
+
+
+# Marcador para claves ausentes (None es un valor JSON válido)
+_MISSING = object()
+
+# Esquema de configuración: clave -> (tipo esperado, validación adicional o None)
+_CONFIG_SCHEMA = {
+    'position_x': (int, _is_valid_position),
+    'position_y': (int, _is_valid_position),
+    'editor_command': (str, None),
+    'button_color': (str, is_valid_color),
+    'show_label': (bool, None),
+    'autostart': (bool, None),
+    'always_visible': (bool, None),
+    'favorite_folders': (list, _is_str_list),
+    'favorite_colors': (dict, _is_str_dict),
+    'icon_source': (str, None),
+}
+
+
+def _iter_icon_paths():
+    """Rutas de iconos de VSCode presentes en disco, de la más a la menos habitual (perezoso)"""
+    candidates = (
+        # Instalaciones .deb/.rpm
+        '/usr/share/icons/hicolor/256x256/apps/code.png',
+        '/usr/share/pixmaps/vscode.png',
+        '/usr/share/icons/hicolor/48x48/apps/code.png',
+        '/usr/share/icons/hicolor/32x32/apps/code.png',
+        # Iconos del usuario
+        f"{_USER_HOME}/.local/share/icons/hicolor/256x256/apps/code.png",
+        f"{_USER_HOME}/.local/share/icons/vscode.png",
+        # Snap y tarball en /opt
+        '/snap/code/current/meta/gui/com.visualstudio.code.png',
+        '/opt/visual-studio-code/resources/app/resources/linux/code.png',
+        # Try to use the project's icon.svg if available
+        f"{get_executable_dir()}/icon.svg",
+        f"{get_executable_dir()}/icon.png"
+    )
+    for path in candidates:
+        if os.path.isfile(path):
+            yield path
+
+
+@lru_cache(maxsize=1)
 def is_portable_mode():
     """Detectar si se está ejecutando en modo portable (PyInstaller)"""
     return getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS')
 
 
+@lru_cache(maxsize=1)
 def get_executable_dir():
     """Obtener el directorio del ejecutable (portable) o del script"""
     if is_portable_mode():
@@ -166,14 +1015,13 @@ def get_config_dir():
     """Obtener directorio de configuración según el modo"""
     if is_portable_mode():
         # Modo portable: usar carpeta 'conf' junto al ejecutable
-        config_dir = os.path.join(get_executable_dir(), 'conf')
+        config_dir = f"{get_executable_dir()}/conf"
     else:
         # Modo instalado: usar directorio estándar del sistema
-        config_dir = os.path.expanduser('~/.config/nautilus-vscode-widget')
+        config_dir = f"{_USER_HOME}/.config/nautilus-vscode-widget"
 
     # Crear el directorio si no existe con permisos seguros (solo usuario)
-    if not os.path.exists(config_dir):
-        os.makedirs(config_dir, mode=0o700, exist_ok=True)
+    os.makedirs(config_dir, mode=0o700, exist_ok=True)
 
     return config_dir
 
@@ -182,48 +1030,42 @@ def get_log_dir():
     """Obtener directorio de logs según el modo"""
     if is_portable_mode():
         # Modo portable: usar carpeta 'logs' junto al ejecutable
-        log_dir = os.path.join(get_executable_dir(), 'logs')
+        log_dir = f"{get_executable_dir()}/logs"
     else:
         # Modo instalado: usar directorio estándar del sistema
-        log_dir = os.path.expanduser('~/.local/share/nautilus-vscode-widget')
+        log_dir = f"{_USER_HOME}/.local/share/nautilus-vscode-widget"
 
     # Crear el directorio si no existe con permisos seguros (solo usuario)
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir, mode=0o700, exist_ok=True)
+    os.makedirs(log_dir, mode=0o700, exist_ok=True)
 
     return log_dir
 
 
+@lru_cache(maxsize=1)
 def get_autostart_file():
-    """Obtener ruta del archivo de autostart según el modo"""
-    if is_portable_mode():
-        # En modo portable, el autostart funciona diferente
-        # Usamos el archivo de autostart del sistema pero apuntando al ejecutable portable
-        autostart_dir = os.path.expanduser('~/.config/autostart')
-        if not os.path.exists(autostart_dir):
-            os.makedirs(autostart_dir, exist_ok=True)
-        return os.path.join(autostart_dir, 'nautilus-vscode-widget.desktop')
-    else:
-        # Modo instalado normal
-        autostart_dir = os.path.expanduser('~/.config/autostart')
-        if not os.path.exists(autostart_dir):
-            os.makedirs(autostart_dir, exist_ok=True)
-        return os.path.join(autostart_dir, 'nautilus-vscode-widget.desktop')
+    """Obtener ruta del archivo de autostart (se resuelve y crea el directorio una sola vez)"""
+    # Mismo archivo en modo portable e instalado; solo cambia el Exec= que contiene
+    autostart_dir = f"{_USER_HOME}/.config/autostart"
+    os.makedirs(autostart_dir, exist_ok=True)
+    return f"{autostart_dir}/nautilus-vscode-widget.desktop"
 
 
 class FloatingButtonApp:
     def __init__(self):
         # Configurar rutas según el modo (portable o instalado)
         self.is_portable = is_portable_mode()
-        self.config_file = os.path.join(get_config_dir(), 'config.json')
+        self.config_file = f"{get_config_dir()}/config.json"
         self.setup_logging()
         self.load_config()
 
         # Detectar entorno de ejecución (v3.3.1)
         self.env = detect_environment()
-        self.logger.info(f"Entorno detectado: {self.env['display_server']} - Desktop: {self.env['desktop']}")
-        self.logger.info(f"Herramientas disponibles - xdotool: {self.env['has_xdotool']}, "
-                        f"xlib: {self.env['xlib_available']}, gdbus: {self.env['has_gdbus']}")
+        # Un único registro para el diagnóstico de arranque
+        self.logger.info(
+            f"Entorno detectado: {self.env['display_server']} - Desktop: {self.env['desktop']}\n"
+            f"Herramientas disponibles - xdotool: {self.env['has_xdotool']}, "
+            f"xlib: {self.env['xlib_available']}, gdbus: {self.env['has_gdbus']}"
+        )
 
         # Initialize variables FIRST
         self.current_directory = None
@@ -234,13 +1076,25 @@ class FloatingButtonApp:
         self.drag_start_y = 0  # Posición inicial del arrastre
         self.window_opacity = 1.0
         self.is_nautilus_focused = False
-        self.fade_timer = None
         self.favorite_buttons = []  # Lista de botones favoritos
+        self._recompute_fav_geometry()  # Geometría del contenedor de favoritos
         self.add_button = None  # Botón de añadir carpetas
-        self.animation_timer = None
-        self.favorite_buttons_visible = False
-        self.expand_animation_progress = 0.0
-        self.drag_update_pending = False  # Para throttle de actualización durante drag
+        self._pending_move = None  # Última posición de drag aún no aplicada
+        self._move_idle_id = None  # Idle que aplica la posición pendiente
+        self._resolved_editor = None  # Ruta del editor que ya funcionó en esta sesión
+        self._detection_in_flight = False  # Detección de directorio en curso (hilo de fondo)
+        self._favorites_window_visible = False  # Espejo de favorites_window.get_visible()
+        self._folder_cache_time = 0.0  # Última vez que se vació la caché de búsqueda de carpetas
+        self._dir_cache = (None, None, 0.0)  # (ventana activa, directorio, instante) de la última detección
+        self._home_index = {}  # Subcarpetas de home: nombre en casefold -> ruta
+        self._home_index_time = 0.0  # Última vez que se leyó home con scandir
+        self._config_dirty = False  # Cambios de configuración pendientes de escribir
+        self._config_flush_id = None  # Timer de escritura diferida
+        self.launched_processes = deque(maxlen=32)  # Editores lanzados (acotado)
+        self._css_provider = None  # Provider del CSS global estático
+        self._color_css_provider = None  # Provider con @main_button_color
+        self._zorder_pending = False  # Corrección de z-order ya programada
+        self._css_signature = None  # Color con el que se generó el CSS global actual
 
         # Optimización: Eliminar timers de detección continua - solo detectar al hacer clic
         self.subprocess_cache = SubprocessCache(ttl=5.0, max_size=50)  # 5 segundos de caché, máximo 50 entradas
@@ -295,16 +1149,20 @@ class FloatingButtonApp:
         self.window.set_geometry_hints(None, geometry,
                                        Gdk.WindowHints.MIN_SIZE | Gdk.WindowHints.MAX_SIZE)
 
+        # Consultar display y pantalla una sola vez; la geometría del monitor se cachea
+        # y se invalida solo cuando cambian los monitores
+        self._display = Gdk.Display.get_default()
+        self._screen = self._display.get_default_screen()
+        self._monitor_geom = None
+        self._screen.connect('monitors-changed', self._invalidate_monitor_geometry)
+        self._screen.connect('size-changed', self._invalidate_monitor_geometry)
+
         # Position window in bottom right corner by default
-        screen = Gdk.Screen.get_default()
         if self.config.get('first_run', True):
             # Primera vez: posicionar en esquina inferior derecha
-            # Usar métodos modernos para obtener dimensiones de pantalla
-            display = Gdk.Display.get_default()
-            monitor = display.get_primary_monitor() or display.get_monitor(0)
-            geometry = monitor.get_geometry()
-            screen_width = geometry.width
-            screen_height = geometry.height
+            monitor_geom = self._get_monitor_geometry()
+            screen_width = monitor_geom.width
+            screen_height = monitor_geom.height
             # Posicionar en el centro de la pantalla para pruebas
             self.config['position_x'] = screen_width // 2 - self.button_size // 2
             self.config['position_y'] = screen_height // 2 - self.button_size // 2
@@ -337,11 +1195,6 @@ class FloatingButtonApp:
         self.window.add_events(Gdk.EventMask.BUTTON_PRESS_MASK |
                               Gdk.EventMask.BUTTON_RELEASE_MASK |
                               Gdk.EventMask.POINTER_MOTION_MASK)
-        
-        # CRÍTICO: También habilitar eventos en el botón para capturar clics
-        self.button.add_events(Gdk.EventMask.BUTTON_PRESS_MASK |
-                              Gdk.EventMask.BUTTON_RELEASE_MASK |
-                              Gdk.EventMask.POINTER_MOTION_MASK)
 
         # Timer periódico para asegurar z-order correcto (cada 5 segundos, solo si hay actividad)
         GLib.timeout_add(5000, self._periodic_zorder_check)
@@ -354,13 +1207,9 @@ class FloatingButtonApp:
         self.window_opacity = 1.0
         self.is_nautilus_focused = True
 
-        # Posicionar botones secundarios después de que la ventana esté visible
-        # Se hará en el primer fade_in()
-
         # Forzar la posición guardada después de que la ventana se muestre
         # Esto previene que el window manager reposicione la ventana
-        GLib.idle_add(self._restore_saved_position)
-        GLib.timeout_add(100, self._restore_saved_position)  # Backup después de 100ms
+        self._restore_handler_id = self.window.connect('configure-event', self._on_first_configure)
 
     def set_window_opacity(self, opacity):
         """Set opacity for main window"""
@@ -422,17 +1271,30 @@ class FloatingButtonApp:
     def setup_logging(self):
         """Setup structured logging system"""
         log_dir = get_log_dir()
-        log_file = os.path.join(log_dir, 'widget.log')
+        log_file = f"{log_dir}/widget.log"
         
-        # Configure logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file, encoding='utf-8'),
-                logging.StreamHandler(sys.stdout)
-            ]
+        log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        file_handler = FastRotatingFileHandler(log_file, maxBytes=1024 * 1024,
+                                               backupCount=3, encoding='utf-8')
+        file_handler.setFormatter(log_formatter)
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(log_formatter)
+        # Sin terminal (autostart, nohup) la consola solo recibe errores
+        if not sys.stdout.isatty():
+            console_handler.setLevel(logging.ERROR)
+
+        # La escritura se hace en un hilo aparte: el bucle de GTK solo encola el registro
+        log_queue = queue.SimpleQueue()
+        self.log_listener = logging.handlers.QueueListener(
+            log_queue, file_handler, console_handler, respect_handler_level=True
         )
+        self.log_listener.start()
+        atexit.register(self.log_listener.stop)
+
+        # Configure logging
+        root_logger = logging.getLogger()
+        root_logger.setLevel(logging.INFO)
+        root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
         
         self.logger = logging.getLogger('NautilusVSCodeWidget')
         self.logger.info(f"Widget iniciado - Versión {VERSION}")
@@ -448,18 +1310,17 @@ class FloatingButtonApp:
             'autostart': False,
             'always_visible': True,  # Widget siempre visible (v3.3.6 - optimización de rendimiento)
             'favorite_folders': [],  # Lista de carpetas favoritas
-            'favorite_colors': {}  # Diccionario de colores para carpetas favoritas
+            'favorite_colors': {},  # Diccionario de colores para carpetas favoritas
+            'icon_source': ''  # Icono resuelto en el último arranque ('file:<ruta>')
         }
 
         try:
             config_dir = os.path.dirname(self.config_file)
-            if not os.path.exists(config_dir):
-                os.makedirs(config_dir)
-                self.logger.info(f"Directorio de configuración creado: {config_dir}")
+            os.makedirs(config_dir, mode=0o700, exist_ok=True)
 
             if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    loaded_config = json.load(f)
+                with open(self.config_file, 'rb') as f:
+                    loaded_config = _json_loads(f.read())
                 
                 # Validar configuración cargada
                 self.config = self.validate_config(loaded_config, default_config)
@@ -477,81 +1338,68 @@ class FloatingButtonApp:
         """Validate and sanitize loaded configuration"""
         validated_config = default_config.copy()
         
-        # Validar tipos de datos
-        for key, default_value in default_config.items():
-            if key in loaded_config:
-                loaded_value = loaded_config[key]
-                
-                # Validar tipo de dato
-                if type(loaded_value) != type(default_value):
-                    self.logger.warning(f"Tipo incorrecto para {key}: {type(loaded_value)}. Usando valor por defecto.")
-                    continue
-                
-                # Validaciones específicas por tipo
-                if isinstance(default_value, list):
-                    # Para listas, verificar que todos los elementos sean strings
-                    if all(isinstance(item, str) for item in loaded_value):
-                        validated_config[key] = loaded_value
-                    else:
-                        self.logger.warning(f"Lista inválida para {key}. Usando valor por defecto.")
-                elif isinstance(default_value, dict):
-                    # Para diccionarios, verificar que claves y valores sean strings
-                    if all(isinstance(k, str) and isinstance(v, str) for k, v in loaded_value.items()):
-                        validated_config[key] = loaded_value
-                    else:
-                        self.logger.warning(f"Diccionario inválido para {key}. Usando valor por defecto.")
-                elif isinstance(default_value, bool):
-                    validated_config[key] = bool(loaded_value)
-                elif isinstance(default_value, int):
-                    # Para enteros, verificar rango razonable
-                    if -10000 <= loaded_value <= 10000:
-                        validated_config[key] = loaded_value
-                    else:
-                        self.logger.warning(f"Valor fuera de rango para {key}: {loaded_value}. Usando valor por defecto.")
-                elif isinstance(default_value, str):
-                    # Para strings, validar formato de color si es button_color
-                    if key == 'button_color':
-                        if self.is_valid_color(loaded_value):
-                            validated_config[key] = loaded_value
-                        else:
-                            self.logger.warning(f"Color inválido para {key}: {loaded_value}. Usando valor por defecto.")
-                    else:
-                        validated_config[key] = loaded_value
-                else:
-                    validated_config[key] = loaded_value
-        
-        return validated_config
+        # Validar tipos de datos contra el esquema
+        for key, (expected_type, check) in _CONFIG_SCHEMA.items():
+            loaded_value = loaded_config.get(key, _MISSING)
+            if loaded_value is _MISSING:
+                continue
 
-    def is_valid_color(self, color_str):
-        """Validate color string format"""
-        if not isinstance(color_str, str):
-            return False
-        
-        # Validar formato hexadecimal
-        if color_str.startswith('#') and len(color_str) in [4, 7, 9]:
-            try:
-                int(color_str[1:], 16)
-                return True
-            except ValueError:
-                return False
+            # Tipo exacto: un bool no debe aceptarse como posición (bool hereda de int)
+            if type(loaded_value) is not expected_type:
+                self.logger.warning(f"Tipo incorrecto para {key}: {type(loaded_value)}. Usando valor por defecto.")
+                continue
+
+            if check is None or check(loaded_value):
+                validated_config[key] = loaded_value
+            else:
+                self.logger.warning(f"Valor inválido para {key}: {loaded_value}. Usando valor por defecto.")
         
-        # Validar nombres de colores CSS básicos
-        basic_colors = ['black', 'white', 'red', 'green', 'blue', 'yellow', 'cyan', 'magenta', 
-                       'gray', 'grey', 'orange', 'purple', 'pink', 'brown']
-        return color_str.lower() in basic_colors
+        return validated_config
 
     def save_config(self):
         """Save configuration to file"""
         try:
             config_dir = os.path.dirname(self.config_file)
-            if not os.path.exists(config_dir):
-                os.makedirs(config_dir)
+            os.makedirs(config_dir, mode=0o700, exist_ok=True)
+
+            # Serializar antes de abrir: un error no deja el fichero a medias
+            payload = _json_dumps(self.config)
 
-            with open(self.config_file, 'w') as f:
-                json.dump(self.config, f, indent=2)
+            # Escritura atómica: fichero temporal + rename
+            tmp_file = f"{self.config_file}.tmp"
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                view = memoryview(payload)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
+            os.replace(tmp_file, self.config_file)
         except Exception as e:
             print(f"Error saving config: {e}")
 
+    def _mark_config_dirty(self):
+        """Marcar la configuración como modificada y programar una escritura diferida"""
+        self._config_dirty = True
+        # Debounce: cada cambio reinicia la espera, una ráfaga produce una sola escritura
+        if self._config_flush_id is not None:
+            GLib.source_remove(self._config_flush_id)
+        self._config_flush_id = GLib.timeout_add(300, self._flush_config)
+
+    def _flush_config(self):
+        """Escribir la configuración si hay cambios pendientes"""
+        self._config_flush_id = None
+        if self._config_dirty:
+            self._config_dirty = False
+            self.save_config()
+        return False  # No repetir
+
+    def flush_config(self):
+        """Escribir ya los cambios pendientes (al salir), cancelando la escritura diferida"""
+        if self._config_flush_id is not None:
+            GLib.source_remove(self._config_flush_id)
+        self._flush_config()
+
     def create_button(self):
         """Create the main button"""
         # Main container - Fixed box en lugar de Overlay
@@ -566,6 +1414,10 @@ class FloatingButtonApp:
 
         # Button - posicionado en 0,0 para que esté completamente fijo
         self.button = Gtk.Button()
+        # Habilitar eventos de mouse antes de realizar el widget (una sola vez)
+        self.button.add_events(Gdk.EventMask.BUTTON_PRESS_MASK |
+                              Gdk.EventMask.BUTTON_RELEASE_MASK |
+                              Gdk.EventMask.POINTER_MOTION_MASK)
         self.button.set_size_request(self.button_size, self.button_size)
         self.button.set_relief(Gtk.ReliefStyle.NONE)
         # Eliminar cualquier margen o padding
@@ -590,66 +1442,61 @@ class FloatingButtonApp:
         box.set_margin_end(0)
 
         # Try to load VSCode icon, fallback to SVG or emoji
-        icon_loaded = False
-        try:
-            # Try to load VSCode icon from system with more comprehensive search
-            icon_theme = Gtk.IconTheme.get_default()
-            vscode_icon_names = [
-                'com.visualstudio.code',
-                'vscode',
-                'visual-studio-code',
-                'code',
-                'code-binary',
-                'visual-studio',
-                'com.microsoft.vscode',
-                'vscodium',
-                'com.vscodium.codium'
-            ]
-
-            for icon_name in vscode_icon_names:
-                if icon_theme.has_icon(icon_name):
-                    try:
-                        icon = Gtk.Image.new_from_icon_name(icon_name, Gtk.IconSize.LARGE_TOOLBAR)
-                        icon.set_pixel_size(24)
-                        box.pack_start(icon, True, True, 0)
-                        icon_loaded = True
-                        self.logger.info(f"Icono cargado: {icon_name}")
-                        break
-                    except Exception as e:
-                        self.logger.warning(f"Error cargando icono {icon_name}: {e}")
-                        continue
-        except Exception as e:
-            self.logger.error(f"No se pudo cargar icono del sistema: {e}")
+        # Camino rápido: reutilizar el icono resuelto en una ejecución anterior
+        icon_source = self.config.get('icon_source', '')
+        icon_loaded = self._load_cached_icon(box, icon_source)
+
+        if not icon_loaded:
+            icon_source = ''
+            try:
+                # Try to load VSCode icon from system with more comprehensive search
+                icon_theme = Gtk.IconTheme.get_default()
+                vscode_icon_names = [
+                    'com.visualstudio.code',
+                    'vscode',
+                    'visual-studio-code',
+                    'code',
+                    'code-binary',
+                    'visual-studio',
+                    'com.microsoft.vscode',
+                    'vscodium',
+                    'com.vscodium.codium'
+                ]
+
+                # Una sola búsqueda en el tema con todos los nombres en orden de preferencia,
+                # al factor de escala de la pantalla para que se vea nítido en HiDPI
+                icon_info = icon_theme.choose_icon_for_scale(
+                    vscode_icon_names, 24, self.window.get_scale_factor(),
+                    Gtk.IconLookupFlags.USE_BUILTIN | Gtk.IconLookupFlags.FORCE_SIZE
+                )
+                if icon_info is not None:
+                    icon = Gtk.Image.new_from_surface(icon_info.load_surface(None))
+                    box.pack_start(icon, True, True, 0)
+                    icon_loaded = True
+                    icon_filename = icon_info.get_filename()
+                    icon_source = f'file:{icon_filename}' if icon_filename else ''
+                    self.logger.info(f"Icono cargado del tema: {icon_filename}")
+            except Exception as e:
+                self.logger.error(f"No se pudo cargar icono del sistema: {e}")
 
         # If icon not found, try custom SVG path with more locations
         if not icon_loaded:
-            custom_icon_paths = [
-                '/usr/share/pixmaps/vscode.png',
-                '/usr/share/icons/hicolor/256x256/apps/code.png',
-                '/usr/share/icons/hicolor/48x48/apps/code.png',
-                '/usr/share/icons/hicolor/32x32/apps/code.png',
-                '/var/lib/snapd/desktop/applications/code_code.desktop',
-                '/snap/code/current/meta/gui/com.visualstudio.code.png',
-                '/opt/visual-studio-code/resources/app/resources/linux/code.png',
-                os.path.expanduser('~/.local/share/icons/vscode.png'),
-                os.path.expanduser('~/.local/share/icons/hicolor/256x256/apps/code.png'),
-                # Try to use the project's icon.svg if available
-                os.path.join(get_executable_dir(), 'icon.svg'),
-                os.path.join(get_executable_dir(), 'icon.png')
-            ]
-
-            for icon_path in custom_icon_paths:
-                if os.path.exists(icon_path):
-                    try:
-                        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(icon_path, 24, 24, True)
-                        icon = Gtk.Image.new_from_pixbuf(pixbuf)
-                        box.pack_start(icon, True, True, 0)
-                        icon_loaded = True
-                        self.logger.info(f"Icono cargado desde archivo: {icon_path}")
-                        break
-                    except Exception as e:
-                        self.logger.warning(f"Error cargando {icon_path}: {e}")
-                        continue
+            for icon_path in _iter_icon_paths():
+                try:
+                    icon = self._load_icon_file(icon_path)
+                    box.pack_start(icon, True, True, 0)
+                    icon_loaded = True
+                    icon_source = f'file:{icon_path}'
+                    self.logger.info(f"Icono cargado desde archivo: {icon_path}")
+                    break
+                except Exception as e:
+                    self.logger.warning(f"Error cargando {icon_path}: {e}")
+                    continue
+
+        # Recordar el origen del icono para el próximo arranque
+        if icon_source != self.config.get('icon_source', ''):
+            self.config['icon_source'] = icon_source
+            self._mark_config_dirty()
 
         # Final fallback: use the lightning emoji as requested
         if not icon_loaded:
@@ -659,11 +1506,6 @@ class FloatingButtonApp:
 
         self.button.add(box)
 
-        # Habilitar eventos de mouse en el botón
-        self.button.add_events(Gdk.EventMask.BUTTON_PRESS_MASK |
-                              Gdk.EventMask.BUTTON_RELEASE_MASK |
-                              Gdk.EventMask.POINTER_MOTION_MASK)
-
         self.button.connect('clicked', self.on_button_clicked)
 
         # Right-click menu y drag con click largo
@@ -677,6 +1519,27 @@ class FloatingButtonApp:
         # Tooltip
         self.update_tooltip()
 
+    def _load_icon_file(self, path):
+        """Cargar un icono de archivo a 24 px lógicos, nítido con el factor de escala de la pantalla"""
+        scale = self.window.get_scale_factor()
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(path, 24 * scale, 24 * scale, True)
+        return Gtk.Image.new_from_surface(Gdk.cairo_surface_create_from_pixbuf(pixbuf, scale, None))
+
+    def _load_cached_icon(self, box, icon_source):
+        """Cargar el icono guardado en la configuración ('file:<ruta>')"""
+        kind, _, ref = icon_source.partition(':')
+        try:
+            if kind == 'file' and os.path.isfile(ref):
+                icon = self._load_icon_file(ref)
+            else:
+                return False
+        except Exception as e:
+            self.logger.warning(f"Icono en caché no válido ({icon_source}): {e}")
+            return False
+
+        box.pack_start(icon, True, True, 0)
+        return True
+
     def create_favorites_container(self):
         """Crear contenedor unificado para botones favoritos"""
         # Crear ventana para el contenedor de favoritos
@@ -700,8 +1563,7 @@ class FloatingButtonApp:
         self.favorites_window.set_resizable(False)
 
         # Transparencia
-        screen = Gdk.Screen.get_default()
-        visual = screen.get_rgba_visual()
+        visual = self._screen.get_rgba_visual()
         if visual:
             self.favorites_window.set_visual(visual)
 
@@ -718,6 +1580,10 @@ class FloatingButtonApp:
 
         self.favorites_window.add(self.favorites_box)
 
+        # Mantener un flag de visibilidad para no consultar GTK en cada evento de movimiento
+        self.favorites_window.connect('show', self._on_favorites_window_visibility, True)
+        self.favorites_window.connect('hide', self._on_favorites_window_visibility, False)
+
         self.favorites_window.show_all()
 
         # Inicialmente oculto
@@ -730,23 +1596,27 @@ class FloatingButtonApp:
         self.rebuild_favorites_list()
 
     def rebuild_favorites_list(self):
-        """Reconstruir toda la lista de favoritos en el orden correcto"""
-        # Limpiar todos los botones del contenedor de forma segura
-        children = self.favorites_box.get_children()
-        for child in children:
-            self.favorites_box.remove(child)
-            child.destroy()
+        """Sincronizar los botones favoritos con la configuración reutilizando los existentes"""
+        folders = self.config.get('favorite_folders') or []
 
-        # Limpiar referencias
-        self.favorite_buttons = []
-        self.add_button = None
+        # Primero: carpetas favoritas (arriba), actualizando en sitio los botones ya creados
+        for i, folder_path in enumerate(folders):
+            if i < len(self.favorite_buttons):
+                self._update_favorite_button(self.favorite_buttons[i], folder_path, i)
+            else:
+                self.create_favorite_button(folder_path, i)
 
-        # Primero: añadir carpetas favoritas (arriba)
-        for i, folder_path in enumerate(self.config.get('favorite_folders', [])):
-            self.create_favorite_button(folder_path, i)
+        # Destruir solo los botones sobrantes
+        for fav in self.favorite_buttons[len(folders):]:
+            fav['button'].destroy()
+        del self.favorite_buttons[len(folders):]
+        self._recompute_fav_geometry()
 
-        # Último: añadir botón + (abajo)
-        self.create_add_button_internal()
+        # Último: botón + (abajo)
+        if self.add_button is None:
+            self.create_add_button_internal()
+        else:
+            self.favorites_box.reorder_child(self.add_button['button'], -1)
 
         # Aplicar estilos y actualizar posiciones DESPUÉS de crear todos los botones
         GLib.idle_add(self._post_rebuild_updates)
@@ -810,20 +1680,15 @@ class FloatingButtonApp:
 
         # Crear botón con clase CSS única para cada favorito
         fav_btn = Gtk.Button()
-        fav_btn.set_name(f"fav-button-{index}")
         fav_btn.set_size_request(btn_size, btn_size)
         fav_btn.set_relief(Gtk.ReliefStyle.NONE)
         fav_btn.set_halign(Gtk.Align.CENTER)  # Alineación horizontal centrada
         fav_btn.set_valign(Gtk.Align.CENTER)  # Alineación vertical centrada
 
         # Icono de carpeta con inicial centrado perfectamente
-        folder_name = os.path.basename(folder_path)
-        initial = folder_name[0].upper() if folder_name else "F"
-
         label = Gtk.Label()
         label.set_halign(Gtk.Align.CENTER)
         label.set_valign(Gtk.Align.CENTER)
-        label.set_markup(f'<span font="10" weight="bold" foreground="white">{initial}</span>')
         label.set_margin_top(0)
         label.set_margin_bottom(0)
         label.set_margin_start(0)
@@ -831,64 +1696,64 @@ class FloatingButtonApp:
 
         fav_btn.add(label)
 
-        # Conectar eventos
-        fav_btn.connect('clicked', lambda b: self.on_favorite_clicked(folder_path))
-        fav_btn.connect('button-press-event', lambda w, e: self.on_favorite_right_click(w, e, folder_path))
-        fav_btn.set_tooltip_text(f"Abrir: {folder_path}")
-
-        # Añadir al contenedor de favoritos
-        self.favorites_box.pack_start(fav_btn, False, False, 0)
-
         # Guardar referencia
         fav_data = {
             'button': fav_btn,
-            'path': folder_path,
+            'label': label,
+            'path': None,
+            'name': None,
             'size': btn_size,
-            'index': index
+            'index': None,
+            'css_provider': None,  # Provider CSS propio del botón
+            'css_key': None  # (índice, color) con el que se cargó
         }
+        self._update_favorite_button(fav_data, folder_path, index)
+
+        # Conectar eventos: leen la ruta de fav_data, así el botón se puede reutilizar
+        fav_btn.connect('clicked', self._on_favorite_button_clicked, fav_data)
+        fav_btn.connect('button-press-event', self._on_favorite_button_press, fav_data)
+
+        # Añadir al contenedor de favoritos, delante del botón +
+        self.favorites_box.pack_start(fav_btn, False, False, 0)
+        self.favorites_box.reorder_child(fav_btn, index)
         self.favorite_buttons.append(fav_data)
 
         # Mostrar el botón
         fav_btn.show_all()
 
+    def _update_favorite_button(self, fav, folder_path, index):
+        """Actualizar en sitio nombre CSS, inicial y tooltip de un botón favorito"""
+        if fav['index'] != index:
+            fav['button'].set_name(f"fav-button-{index}")
+            fav['index'] = index
 
-    def update_favorite_positions(self):
-        """Actualizar las posiciones de los botones favoritos y el botón +"""
-        if not hasattr(self, 'favorites_window'):
-            return
+        if fav['path'] != folder_path:
+            # Nombre de la carpeta calculado una sola vez por ruta
+            folder_name = os.path.basename(folder_path)
+            fav['name'] = folder_name
+            initial = folder_name[0].upper() if folder_name else "F"
+            fav['label'].set_markup(f'<span font="10" weight="bold" foreground="white">{initial}</span>')
+            fav['button'].set_tooltip_text(f"Abrir: {folder_path}")
+            fav['path'] = folder_path
 
-        # Calcular tamaño del contenedor basado en número de botones
-        num_buttons = len(self.favorite_buttons)
+    def _on_favorite_button_clicked(self, button, fav):
+        """Abrir la carpeta asociada actualmente al botón"""
+        self.on_favorite_clicked(fav['path'])
 
-        # Tamaño del contenedor
-        btn_size = 24
-        spacing = 4
-        margin = 8
+    def _on_favorite_button_press(self, widget, event, fav):
+        """Menú contextual de la carpeta asociada actualmente al botón"""
+        return self.on_favorite_right_click(widget, event, fav['path'], fav['name'])
 
-        # Calcular tamaño del contenedor
-        container_width = btn_size + margin * 2
-        if num_buttons == 0:
-            # Solo el botón + : darle más margen para evitar superposición
-            container_height = btn_size + margin * 2
-        else:
-            # Favoritos + botón +
-            container_height = (btn_size + spacing) * (num_buttons + 1) + margin * 2 - spacing
 
-        self.favorites_window.set_default_size(container_width, container_height)
+    def update_favorite_positions(self):
+        """Actualizar las posiciones de los botones favoritos y el botón +"""
+        if not hasattr(self, 'favorites_window'):
+            return
 
-        # Posicionar el contenedor encima del botón principal
+        # Una sola consulta de posición al servidor de ventanas por relayout
         main_x, main_y = self.window.get_position()
-        main_center_x = main_x + self.button_size // 2
-
-        # Calcular posición centrada horizontalmente
-        container_x = main_center_x - container_width // 2
-
-        # Posicionar encima del botón principal
-        # Separación óptima: pegados pero sin superposición
-        separation = 8 if num_buttons == 0 else 6  # Más pegados
-        container_y = main_y - container_height - separation
-
-        self.favorites_window.move(container_x, container_y)
+        container_width, container_height = self._relayout_favorites(main_x, main_y)
+        self.favorites_window.set_default_size(container_width, container_height)
 
         # IMPORTANTE: Solo mostrar si la ventana principal está visible
         # Si está oculta (opacidad 0), también ocultar favoritos para evitar bloquear eventos
@@ -897,11 +1762,19 @@ class FloatingButtonApp:
             self.set_widget_opacity(self.favorites_window, self.window_opacity)
 
             # CRÍTICO: Forzar z-order después de cada actualización para evitar que se pierda
-            GLib.idle_add(self._ensure_correct_zorder)
+            # (una sola corrección pendiente por ciclo de idle)
+            if not self._zorder_pending:
+                self._zorder_pending = True
+                GLib.idle_add(self._do_zorder)
         else:
             # Ocultar completamente para no bloquear eventos del mouse
             self.favorites_window.hide()
 
+    def _do_zorder(self):
+        """Ejecutar la corrección de z-order pendiente"""
+        self._zorder_pending = False
+        return self._ensure_correct_zorder()
+
     def _ensure_correct_zorder(self):
         """Asegurar que el z-order sea correcto: favoritos abajo, botón principal arriba"""
         try:
@@ -924,13 +1797,32 @@ class FloatingButtonApp:
         self.recent_activity = False
 
         # Solo corregir si ambas ventanas están visibles
-        if (self.window_opacity > 0 and
-            hasattr(self, 'favorites_window') and
-            self.favorites_window.get_visible()):
+        if self.window_opacity > 0 and self._favorites_window_visible:
             self._ensure_correct_zorder()
 
         return True  # Continuar el timer
 
+    def _get_monitor_geometry(self):
+        """Geometría del monitor principal, consultada solo si no está en caché"""
+        if self._monitor_geom is None:
+            monitor = self._display.get_primary_monitor() or self._display.get_monitor(0)
+            geom = monitor.get_geometry()
+            # Algunos drivers reportan geometrías transitorias diminutas: no cachearlas
+            if geom.width < 64 or geom.height < 64:
+                return geom
+            self._monitor_geom = geom
+        return self._monitor_geom
+
+    def _invalidate_monitor_geometry(self, screen):
+        """Descartar la geometría cacheada al cambiar monitores o tamaño de pantalla"""
+        self._monitor_geom = None
+
+    def _on_first_configure(self, widget, event):
+        """Restaurar la posición en el primer configure-event y desconectarse"""
+        self.window.disconnect(self._restore_handler_id)
+        self._restore_saved_position()
+        return False  # Propagar el evento
+
     def _restore_saved_position(self):
         """Forzar la restauración de la posición guardada en la configuración.
         Esto previene que el window manager reposicione la ventana al mostrarla."""
@@ -968,12 +1860,11 @@ class FloatingButtonApp:
         response = dialog.run()
         if response == Gtk.ResponseType.OK:
             folder_path = dialog.get_filename()
-            if folder_path and folder_path not in self.config.get('favorite_folders', []):
+            favorites = self.config.setdefault('favorite_folders', [])
+            if folder_path and folder_path not in favorites:
                 # Añadir a la configuración
-                if 'favorite_folders' not in self.config:
-                    self.config['favorite_folders'] = []
-                self.config['favorite_folders'].append(folder_path)
-                self.save_config()
+                favorites.append(folder_path)
+                self._mark_config_dirty()
 
                 # Reconstruir lista completa de favoritos (incluye update_favorite_positions)
                 self.rebuild_favorites_list()
@@ -992,14 +1883,14 @@ class FloatingButtonApp:
             self.try_open_with_editor()
             self.current_directory = temp_dir  # Restaurar
 
-    def on_favorite_right_click(self, widget, event, folder_path):
+    def on_favorite_right_click(self, widget, event, folder_path, folder_name):
         """Mostrar menú contextual para eliminar carpeta favorita"""
         if event.button == 3:  # Clic derecho
             menu = Gtk.Menu()
 
             # Item para cambiar color
             color_item = Gtk.MenuItem(label="🎨 Cambiar color")
-            color_item.connect('activate', lambda x: self.show_color_picker(folder_path))
+            color_item.connect('activate', self._on_fav_color_activate, folder_path, folder_name)
             menu.append(color_item)
 
             # Separator
@@ -1007,7 +1898,7 @@ class FloatingButtonApp:
 
             # Item para eliminar
             delete_item = Gtk.MenuItem(label="❌ Eliminar de favoritos")
-            delete_item.connect('activate', lambda x: self.remove_favorite_folder(folder_path))
+            delete_item.connect('activate', self._on_fav_remove_activate, folder_path)
             menu.append(delete_item)
 
             menu.show_all()
@@ -1015,24 +1906,38 @@ class FloatingButtonApp:
             return True
         return False
 
+    def _on_fav_color_activate(self, item, folder_path, folder_name):
+        """Callback del menú: cambiar el color de un favorito"""
+        self.show_color_picker(folder_path, folder_name)
+
+    def _on_fav_remove_activate(self, item, folder_path):
+        """Callback del menú: eliminar un favorito"""
+        self.remove_favorite_folder(folder_path)
+
+    @staticmethod
+    def _on_quit_activate(item):
+        """Callback del menú: salir de la aplicación"""
+        Gtk.main_quit()
+
     def remove_favorite_folder(self, folder_path):
         """Eliminar carpeta de favoritos"""
-        if folder_path in self.config.get('favorite_folders', []):
-            self.config['favorite_folders'].remove(folder_path)
-            self.save_config()
+        favorites = self.config.get('favorite_folders') or []
+        if folder_path in favorites:
+            favorites.remove(folder_path)
+            self._mark_config_dirty()
 
             # Reconstruir lista completa de favoritos (incluye update_favorite_positions)
             self.rebuild_favorites_list()
 
-    def show_color_picker(self, folder_path):
+    def show_color_picker(self, folder_path, folder_name):
         """Mostrar diálogo para cambiar color de carpeta favorita"""
         dialog = Gtk.ColorChooserDialog(
-            title=f"Color para {os.path.basename(folder_path)}",
+            title=f"Color para {folder_name}",
             parent=None
         )
 
         # Establecer color actual
-        current_color = self.config.get('favorite_colors', {}).get(folder_path, '#1E1E23')
+        current_color = (self.config.get('favorite_colors') or {}).get(folder_path, '#1E1E23')
         color = Gdk.RGBA()
         color.parse(current_color)
         dialog.set_rgba(color)
@@ -1041,167 +1946,74 @@ class FloatingButtonApp:
         if response == Gtk.ResponseType.OK:
             # Guardar nuevo color
             new_color = dialog.get_rgba()
-            color_hex = f'#{int(new_color.red*255):02x}{int(new_color.green*255):02x}{int(new_color.blue*255):02x}'
+            color_hex = _rgba_to_hex(new_color)
             
-            # Actualizar configuración
-            if 'favorite_colors' not in self.config:
-                self.config['favorite_colors'] = {}
-            self.config['favorite_colors'][folder_path] = color_hex
-            self.save_config()
-
-            # Aplicar nuevos estilos
-            self.apply_styles()
-
-        dialog.destroy()
-
-    def apply_styles(self):
-        """Apply modern CSS styles with animations and glassmorphism effects"""
-        css_provider = Gtk.CssProvider()
-
-        color = self.config.get('button_color', '#007ACC')
-
-        # Convert hex color to rgba with transparency
-        hex_color = color.lstrip('#')
-        r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-
-        # Generate dynamic CSS for favorite buttons with custom colors
-        favorite_css = ""
-        for i, fav in enumerate(self.favorite_buttons):
-            folder_path = fav['path']
-            fav_color = self.config.get('favorite_colors', {}).get(folder_path, '#1E1E23')
-            fav_hex = fav_color.lstrip('#')
-            fav_r, fav_g, fav_b = tuple(int(fav_hex[i:i+2], 16) for i in (0, 2, 4))
-            
-            favorite_css += f"""
-            /* Botón favorito para {os.path.basename(folder_path)} */
-            #fav-button-{i} {{
-                border-radius: 12px;
-                background: rgba({fav_r}, {fav_g}, {fav_b}, 0.95);
-                color: white;
-                border: 1px solid rgba(255, 255, 255, 0.2);
-                transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-                padding: 0;
-                margin: 0;
-            }}
-
-        #fav-button-{i}:hover {{
-            background: rgba({fav_r}, {fav_g}, {fav_b}, 1.0);
-            border: 1px solid rgba(255, 255, 255, 0.3);
-        }}
-
-        #fav-button-{i}:active {{
-            background: rgba({fav_r}, {fav_g}, {fav_b}, 0.85);
-        }}
-            """
-
-        css = f"""
-        /* Ventana del widget principal */
-        #floating-button {{
-            background-color: rgba(0, 0, 0, 0);
-            background: transparent;
-        }}
-
-        /* Contenedor de favoritos con fondo personalizable */
-        #favorites-container {{
-            background: rgba(40, 40, 45, 0.95);
-            border-radius: 12px;
-            border: 1px solid rgba(255, 255, 255, 0.15);
-        }}
-
-        /* Botón principal - simple sin sombras */
-        #floating-button button {{
-            border-radius: 20px;
-            background: rgba({r}, {g}, {b}, 0.95);
-            color: white;
-            border: 2px solid rgba(255, 255, 255, 0.25);
-            transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-            padding: 0;
-            margin: 0;
-            min-width: 36px;
-            min-height: 36px;
-        }}
-
-        #floating-button button * {{
-            padding: 0;
-            margin: 0;
-        }}
-
-        #floating-button button:hover {{
-            background: rgba({r}, {g}, {b}, 1.0);
-            border: 2px solid rgba(255, 255, 255, 0.35);
-        }}
-
-        #floating-button button:active {{
-            background: rgba({r}, {g}, {b}, 0.85);
-        }}
-
-        /* Botón + de añadir favoritos - simple sin sombras */
-        #add-fav-button {{
-            border-radius: 12px;
-            background: rgba(60, 60, 65, 0.85);
-            color: white;
-            border: 1px solid rgba(255, 255, 255, 0.15);
-            transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-            padding: 0;
-            margin: 0;
-            opacity: 0.85;
-        }}
-
-        #add-fav-button label {{
-            padding: 0;
-            margin: 0;
-            min-width: 0;
-            min-height: 0;
-        }}
+            # Actualizar configuración
+            self.config.setdefault('favorite_colors', {})[folder_path] = color_hex
+            self._mark_config_dirty()
 
-        #add-fav-button:hover {{
-            background: rgba(80, 80, 85, 0.95);
-            border: 1px solid rgba(255, 255, 255, 0.25);
-            opacity: 1.0;
-        }}
+            # Aplicar nuevos estilos
+            self.apply_styles()
 
-        #add-fav-button:active {{
-            background: rgba(50, 50, 55, 0.8);
-            opacity: 0.9;
-        }}
+        dialog.destroy()
 
-        /* Botones de carpetas favoritas por defecto - sin sombras */
-        #fav-button {{
-            border-radius: 12px;
-            background: rgba(30, 30, 35, 0.95);
-            color: white;
-            border: 1px solid rgba(255, 255, 255, 0.2);
-            transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-            padding: 0;
-            margin: 0;
-        }}
+    def apply_styles(self):
+        """Apply modern CSS styles with animations and glassmorphism effects"""
+        color = self.config.get('button_color', '#007ACC')
 
-        #fav-button label {{
-            padding: 0;
-            margin: 0;
-            min-width: 0;
-            min-height: 0;
-        }}
+        # Cada favorito tiene su propio provider: solo se re-parsea el que cambió
+        favorite_colors = self.config.get('favorite_colors') or {}
+        for fav in self.favorite_buttons:
+            self._apply_favorite_style(fav, favorite_colors.get(fav['path'], '#1E1E23'))
+
+        # El CSS global estático se parsea una sola vez
+        if self._css_provider is None:
+            self._css_provider = Gtk.CssProvider()
+            self._css_provider.load_from_data(_MAIN_CSS.encode('utf-8'))
+            Gtk.StyleContext.add_provider_for_screen(
+                self._screen,
+                self._css_provider,
+                Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
+            )
 
-        #fav-button:hover {{
-            background: rgba(40, 40, 45, 1.0);
-            border: 1px solid rgba(255, 255, 255, 0.3);
-        }}
+        # Nada que regenerar si el color no ha cambiado
+        if color == self._css_signature:
+            return
 
-        #fav-button:active {{
-            background: rgba(25, 25, 30, 0.85);
-        }}
+        # Solo se recarga la definición del color (@main_button_color)
+        r, g, b = _hex_to_rgb(color)
+        if self._color_css_provider is None:
+            self._color_css_provider = Gtk.CssProvider()
+            Gtk.StyleContext.add_provider_for_screen(
+                self._screen,
+                self._color_css_provider,
+                Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
+            )
+        self._color_css_provider.load_from_data(
+            _MAIN_COLOR_CSS_TMPL.format(r=r, g=g, b=b).encode('utf-8')
+        )
+        self._css_signature = color
 
-        {favorite_css}
-        """.encode('utf-8')
+    def _apply_favorite_style(self, fav, fav_color):
+        """Cargar el CSS de un botón favorito en su provider solo si cambió índice o color"""
+        css_key = (fav['index'], fav_color)
+        if fav['css_key'] == css_key:
+            return
 
-        css_provider.load_from_data(css)
+        provider = fav['css_provider']
+        if provider is None:
+            provider = Gtk.CssProvider()
+            fav['button'].get_style_context().add_provider(
+                provider,
+                Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
+            )
+            fav['css_provider'] = provider
 
-        Gtk.StyleContext.add_provider_for_screen(
-            Gdk.Screen.get_default(),
-            css_provider,
-            Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
-        )
+        fav_r, fav_g, fav_b = _hex_to_rgb(fav_color)
+        provider.load_from_data(_FAV_CSS_TMPL.format(
+            i=fav['index'], r=fav_r, g=fav_g, b=fav_b, name=fav['name']
+        ).encode('utf-8'))
+        fav['css_key'] = css_key
 
     def adjust_color(self, hex_color, percent):
         """Adjust color brightness by percentage"""
@@ -1234,64 +2046,95 @@ class FloatingButtonApp:
         if event.button == 1:
             # Check if it was a drag or a click
             if self.dragging:
-                drag_distance = ((event.x_root - self.drag_start_x) ** 2 +
-                               (event.y_root - self.drag_start_y) ** 2) ** 0.5
+                dx = event.x_root - self.drag_start_x
+                dy = event.y_root - self.drag_start_y
 
-                if drag_distance < 5:  # Less than 5 pixels = click, not drag
+                if dx * dx + dy * dy < 25:  # Less than 5 pixels = click, not drag
                     # It's a click, trigger the button action
                     self.dragging = False
                     return False  # Let the clicked signal handle it
                 else:
                     # It was a drag
                     self.dragging = False
+                    self._flush_move()
                     # Save new position
                     x, y = self.window.get_position()
                     self.config['position_x'] = x
                     self.config['position_y'] = y
-                    self.save_config()
+                    self._mark_config_dirty()
                     return True  # Prevent clicked signal
         return False
 
     def on_button_motion(self, widget, event):
         """Handle mouse motion on the button for dragging"""
         if self.dragging:
-            x = int(event.x_root - self.drag_offset_x)
-            y = int(event.y_root - self.drag_offset_y)
+            return self._do_drag_move(event)
+        return False
 
-            # Mover ventana principal
-            self.window.move(x, y)
+    def _do_drag_move(self, event):
+        """Seguir el puntero durante el drag: mover ventana principal y favoritos en el próximo idle"""
+        self._queue_move(int(event.x_root - self.drag_offset_x),
+                         int(event.y_root - self.drag_offset_y))
+        return True
+
+    def _queue_move(self, x, y):
+        """Guardar la última posición del drag y programar un único movimiento por ciclo"""
+        self._pending_move = (x, y)
+        if self._move_idle_id is None:
+            self._move_idle_id = GLib.idle_add(self._on_move_idle, priority=GLib.PRIORITY_DEFAULT_IDLE)
+
+    def _on_move_idle(self):
+        """Callback idle del movimiento coalescido"""
+        self._move_idle_id = None
+        self._flush_move()
+        return False  # No repetir
 
-            # Actualizar posiciones de favoritos de forma sincronizada
+    def _flush_move(self):
+        """Aplicar ya la posición pendiente a la ventana principal y a los favoritos"""
+        if self._move_idle_id is not None:
+            GLib.source_remove(self._move_idle_id)
+            self._move_idle_id = None
+        if self._pending_move is not None:
+            x, y = self._pending_move
+            self._pending_move = None
+            self.window.move(x, y)
             self._update_favorites_during_drag(x, y)
 
-            return True
-        return False
-
-    def _update_favorites_during_drag(self, main_x, main_y):
-        """Actualizar posición de favoritos durante el drag de forma optimizada"""
-        if not hasattr(self, 'favorites_window') or not self.favorites_window.get_visible():
-            return
-
-        # Calcular nueva posición de favoritos basada en la posición del botón principal
+    def _recompute_fav_geometry(self):
+        """Recalcular tamaño y separación del contenedor de favoritos (solo cambia con su número)"""
         num_buttons = len(self.favorite_buttons)
         btn_size = 24
         spacing = 4
         margin = 8
 
-        container_width = btn_size + margin * 2
+        self._fav_container_w = btn_size + margin * 2
         if num_buttons == 0:
-            container_height = btn_size + margin * 2
+            # Solo el botón + : darle más margen para evitar superposición
+            self._fav_container_h = btn_size + margin * 2
+            self._fav_separation = 8
         else:
-            container_height = (btn_size + spacing) * (num_buttons + 1) + margin * 2 - spacing
-
-        main_center_x = main_x + self.button_size // 2
-        container_x = main_center_x - container_width // 2
+            # Favoritos + botón +
+            self._fav_container_h = (btn_size + spacing) * (num_buttons + 1) + margin * 2 - spacing
+            self._fav_separation = 6  # Pegados pero sin superposición
 
-        separation = 8 if num_buttons == 0 else 6
-        container_y = main_y - container_height - separation
+    def _relayout_favorites(self, main_x, main_y):
+        """Mover el contenedor de favoritos encima del botón principal y devolver su tamaño"""
+        # Centrado horizontalmente y encima del botón principal
+        container_x = main_x + self.button_size // 2 - self._fav_container_w // 2
+        container_y = main_y - self._fav_container_h - self._fav_separation
 
-        # Mover ventana de favoritos de forma sincronizada
         self.favorites_window.move(container_x, container_y)
+        return self._fav_container_w, self._fav_container_h
+
+    def _on_favorites_window_visibility(self, widget, visible):
+        """Actualizar el flag de visibilidad de la ventana de favoritos"""
+        self._favorites_window_visible = visible
+
+    def _update_favorites_during_drag(self, main_x, main_y):
+        """Actualizar posición de favoritos durante el drag de forma optimizada"""
+        if not self._favorites_window_visible:
+            return
+        self._relayout_favorites(main_x, main_y)
 
     def on_button_press(self, widget, event):
         """Handle button press for dragging on window"""
@@ -1305,22 +2148,19 @@ class FloatingButtonApp:
         """Handle button release on window"""
         if event.button == 1:
             self.dragging = False
+            self._flush_move()
             # Save new position
             x, y = self.window.get_position()
             self.config['position_x'] = x
             self.config['position_y'] = y
-            self.save_config()
+            self._mark_config_dirty()
 
     def on_motion(self, widget, event):
         """Handle mouse motion for dragging on window"""
         if self.dragging:
-            x = int(event.x_root - self.drag_offset_x)
-            y = int(event.y_root - self.drag_offset_y)
-            self.window.move(x, y)
             # Marcar actividad para z-order check
             self.recent_activity = True
-            # Actualizar posiciones de favoritos de forma sincronizada
-            self._update_favorites_during_drag(x, y)
+            self._do_drag_move(event)
 
 
 
@@ -1330,63 +2170,6 @@ class FloatingButtonApp:
         # Esta función se mantiene para compatibilidad pero no hace nada
         pass
 
-    def fade_in(self):
-        """Smoothly fade in the button with animations"""
-        if self.fade_timer:
-            GLib.source_remove(self.fade_timer)
-
-        # Marcar actividad para z-order check
-        self.recent_activity = True
-
-        # Actualizar posiciones de botones secundarios antes de mostrar
-        self.update_favorite_positions()
-
-        # Animación suave de fade in
-        self.animate_fade_in()
-
-    def fade_out(self):
-        """Smoothly fade out the button with animations"""
-        if self.fade_timer:
-            GLib.source_remove(self.fade_timer)
-
-        # Marcar actividad para z-order check
-        self.recent_activity = True
-
-        # Animación suave de fade out
-        self.animate_fade_out()
-
-    def animate_fade_in(self):
-        """Animate fade in with smooth transitions"""
-        if self.window_opacity >= 1.0:
-            return
-
-        self.window_opacity = min(1.0, self.window_opacity + 0.1)
-        self.set_window_opacity(self.window_opacity)
-
-        if self.window_opacity < 1.0:
-            self.fade_timer = GLib.timeout_add(20, self.animate_fade_in)
-        else:
-            # Una vez que el botón principal está visible, animar los favoritos
-            self.animate_favorites_expand()
-
-    def animate_fade_out(self):
-        """Animate fade out with smooth transitions"""
-        if self.window_opacity <= 0.0:
-            return
-
-        self.window_opacity = max(0.0, self.window_opacity - 0.1)
-        self.set_window_opacity(self.window_opacity)
-
-        if self.window_opacity > 0.0:
-            self.fade_timer = GLib.timeout_add(20, self.animate_fade_out)
-        else:
-            self.favorite_buttons_visible = False
-            self.expand_animation_progress = 0.0
-            # CRÍTICO: Ocultar ventana de favoritos para no bloquear eventos
-            if hasattr(self, 'favorites_window'):
-                self.favorites_window.hide()
-
-
     def on_button_right_click(self, widget, event):
         """Show context menu on right click"""
         if event.button == 3:  # Right click
@@ -1402,7 +2185,7 @@ class FloatingButtonApp:
 
             # Quit item
             quit_item = Gtk.MenuItem(label="❌ Salir")
-            quit_item.connect('activate', lambda x: Gtk.main_quit())
+            quit_item.connect('activate', self._on_quit_activate)
             menu.append(quit_item)
 
             menu.show_all()
@@ -1411,13 +2194,32 @@ class FloatingButtonApp:
 
     def on_button_clicked(self, button):
         """Handle button click to open VSCode - detección bajo demanda"""
-        # Ejecutar detección de directorio solo al hacer clic
-        self.current_directory = self.get_nautilus_directory_multiple_methods()
-        
-        # Si no se detectó directorio, usar alternativas inteligentes
-        if not self.current_directory or not os.path.exists(self.current_directory):
-            self.current_directory = self.get_directory_from_fallback()
-        
+        # Los clics repetidos mientras se detecta se descartan: ya hay una apertura en camino
+        if self._detection_in_flight:
+            return
+        self._detection_in_flight = True
+
+        # Detectar en segundo plano: subprocesos/DBus/X no deben bloquear la interfaz
+        threading.Thread(target=self._detect_directory_worker, daemon=True).start()
+
+    def _detect_directory_worker(self):
+        """Detectar el directorio actual fuera del hilo de GTK"""
+        directory = None
+        try:
+            directory = self.get_nautilus_directory_multiple_methods()
+
+            # Si no se detectó directorio, usar alternativas inteligentes
+            if not directory or not os.path.exists(directory):
+                directory = self.get_directory_from_fallback()
+        finally:
+            # El resultado se aplica en el hilo principal: sin locks sobre current_directory
+            GLib.idle_add(self._on_directory_detected, directory)
+
+    def _on_directory_detected(self, directory):
+        """Abrir el editor con el directorio detectado (hilo principal)"""
+        self._detection_in_flight = False
+        self.current_directory = directory
+
         if self.current_directory and os.path.exists(self.current_directory):
             success = self.try_open_with_editor()
             if not success:
@@ -1436,14 +2238,18 @@ class FloatingButtonApp:
                 "No se pudo detectar ninguna carpeta válida.\n"
                 "Abre una ventana de Nautilus o usa la configuración para establecer una carpeta por defecto."
             )
-    
+        return False  # No repetir
+
     def try_open_with_editor(self):
         """Try to open with configured editor (v3.3.1 con validación de seguridad)"""
         try:
             editor_cmd = self.config.get('editor_command', 'code')
 
-            # Validar comando de editor (v3.3.1)
-            validated_cmd = validate_editor_command(editor_cmd)
+            # Editor ya resuelto en esta sesión: no volver a validar ni buscar en PATH
+            validated_cmd = self._resolved_editor
+            if not validated_cmd or not os.access(validated_cmd, os.X_OK):
+                # Validar comando de editor (v3.3.1)
+                validated_cmd = validate_editor_command(editor_cmd)
             if not validated_cmd:
                 self.logger.warning(f"Comando de editor inválido o no encontrado: {editor_cmd}")
                 return False
@@ -1462,6 +2268,8 @@ class FloatingButtonApp:
                 stdin=subprocess.DEVNULL,
                 start_new_session=True
             )
+            self._track_process(process)
+            self._resolved_editor = validated_cmd
 
             self.logger.info(f"Editor abierto exitosamente: {validated_cmd} -> {validated_dir}")
             return True
@@ -1476,23 +2284,17 @@ class FloatingButtonApp:
             self.logger.error(f"Error al abrir editor: {e}")
             return False
     
+    def _track_process(self, process):
+        """Registrar un editor lanzado, descartando (y recogiendo) los que ya terminaron"""
+        self.launched_processes = deque(
+            (p for p in self.launched_processes if p.poll() is None),
+            maxlen=32
+        )
+        self.launched_processes.append(process)
+
     def try_open_with_common_editors(self):
         """Try to open with common VSCode installations"""
-        # Lista de comandos comunes para VSCode
-        vscode_commands = [
-            'code',
-            'code-insiders', 
-            'codium',
-            'vscodium',
-            '/usr/bin/code',
-            '/usr/local/bin/code',
-            '/snap/bin/code',
-            '/var/lib/flatpak/app/com.visualstudio.code/current/active/export/bin/com.visualstudio.code',
-            '/opt/visual-studio-code/bin/code',
-            os.path.expanduser('~/.local/bin/code')
-        ]
-        
-        for cmd in vscode_commands:
+        for cmd in _COMMON_EDITOR_COMMANDS:
             try:
                 # Check if command exists
                 if cmd.startswith('/'):
@@ -1500,12 +2302,7 @@ class FloatingButtonApp:
                         continue
                 else:
                     # Check if command is in PATH
-                    check_cmd = subprocess.run(
-                        ['which', cmd],
-                        capture_output=True,
-                        text=True
-                    )
-                    if check_cmd.returncode != 0:
+                    if _which(cmd) is None:
                         continue
                 
                 # Try to open
@@ -1516,11 +2313,13 @@ class FloatingButtonApp:
                     stdin=subprocess.DEVNULL,
                     start_new_session=True
                 )
+                self._track_process(process)
                 
                 print(f"Abriendo {self.current_directory} con {cmd}")
                 # Update config with working command
+                self._resolved_editor = cmd if cmd.startswith('/') else _which(cmd)
                 self.config['editor_command'] = cmd
-                self.save_config()
+                self._mark_config_dirty()
                 return True
                 
             except Exception as e:
@@ -1535,6 +2334,19 @@ class FloatingButtonApp:
 
     def get_nautilus_directory_multiple_methods(self):
         """Try multiple methods to get the current Nautilus directory"""
+        # Clics seguidos sobre la misma ventana activa: reutilizar la última detección
+        active_xid = None
+        if _get_xlib_display() is not None:
+            try:
+                window = _x_active_window()
+                active_xid = window.id if window is not None else None
+            except Exception:
+                active_xid = None
+        cached_xid, cached_dir, cached_at = self._dir_cache
+        if (active_xid is not None and active_xid == cached_xid and
+                time.monotonic() - cached_at < 2.0 and os.path.isdir(cached_dir)):
+            return cached_dir
+
         methods = [
             self.get_directory_from_dbus,  # Más confiable para Nautilus moderno
             self.get_directory_from_active_nautilus_window,
@@ -1544,7 +2356,8 @@ class FloatingButtonApp:
         for method in methods:
             try:
                 directory = method()
-                if directory and os.path.exists(directory):
+                if directory and _is_dir(directory):
+                    self._dir_cache = (active_xid, directory, time.monotonic())
                     return directory
             except Exception:
                 continue
@@ -1554,97 +2367,120 @@ class FloatingButtonApp:
     def get_directory_from_dbus(self):
         """Get directory from Nautilus via DBus - most reliable method"""
         try:
-            # Get active Nautilus window ID first
-            result = subprocess.run(
-                ['xdotool', 'search', '--class', 'nautilus'],
-                capture_output=True,
-                text=True,
-                timeout=2
-            )
-
-            if result.returncode != 0 or not result.stdout.strip():
+            # Solo si la ventana enfocada es Nautilus
+            if not self._is_focused_window_nautilus():
                 return None
 
-            # Get focused window
-            focused_result = subprocess.run(
-                ['xdotool', 'getwindowfocus'],
-                capture_output=True,
-                text=True,
-                timeout=1
+            # Leer la ubicación por DBus directamente (Gio, sin lanzar gdbus)
+            bus = Gio.bus_get_sync(Gio.BusType.SESSION, None)
+            reply = bus.call_sync(
+                'org.gnome.Nautilus',
+                '/org/gnome/Nautilus/window/1',
+                'org.freedesktop.DBus.Properties',
+                'Get',
+                GLib.Variant('(ss)', ('org.gnome.Nautilus.Window', 'location')),
+                GLib.VariantType.new('(v)'),
+                Gio.DBusCallFlags.NONE,
+                2000,
+                None
             )
+            uri = reply.get_child_value(0).get_variant().get_string()
+            if uri.startswith('file://'):
+                path = unquote(uri.replace('file://', ''))
+                if os.path.isdir(path):
+                    return path
 
-            if focused_result.returncode != 0:
-                return None
+        except Exception:
+            pass
 
-            focused_id = focused_result.stdout.strip()
-            window_ids = result.stdout.strip().split('\n')
+        return None
 
-            # Check if focused window is Nautilus
-            if focused_id not in window_ids:
-                return None
+    def _is_focused_window_nautilus(self):
+        """Comprobar si la ventana enfocada es de Nautilus (Xlib si está disponible, si no xdotool)"""
+        if _get_xlib_display() is not None:
+            window = _x_active_window()
+            if window is None:
+                return False
+            wm_class = window.get_wm_class() or ()
+            return any('nautilus' in name.lower() for name in wm_class)
+
+        # Get active Nautilus window ID first
+        result = subprocess.run(
+            ['xdotool', 'search', '--class', 'nautilus'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            stdin=subprocess.DEVNULL,
+            text=True,
+            timeout=2
+        )
 
-            # Use gdbus to get current location from Nautilus
-            dbus_result = subprocess.run(
-                ['gdbus', 'call', '--session',
-                 '--dest', 'org.gnome.Nautilus',
-                 '--object-path', '/org/gnome/Nautilus/window/1',
-                 '--method', 'org.freedesktop.DBus.Properties.Get',
-                 'org.gnome.Nautilus.Window', 'location'],
-                capture_output=True,
-                text=True,
-                timeout=2
-            )
+        if result.returncode != 0 or not result.stdout.strip():
+            return False
 
-            if dbus_result.returncode == 0 and dbus_result.stdout:
-                # Parse the DBus output
-                output = dbus_result.stdout.strip()
-                # Format: (<'file:///path/to/directory'>,)
-                if 'file://' in output:
-                    from urllib.parse import unquote
-                    import re
-                    match = re.search(r"'(file://[^']+)'", output)
-                    if match:
-                        uri = match.group(1)
-                        path = unquote(uri.replace('file://', ''))
-                        if os.path.exists(path) and os.path.isdir(path):
-                            return path
+        # Get focused window
+        focused_result = subprocess.run(
+            ['xdotool', 'getwindowfocus'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            stdin=subprocess.DEVNULL,
+            text=True,
+            timeout=1
+        )
 
-        except Exception:
-            pass
+        if focused_result.returncode != 0:
+            return False
 
-        return None
+        # Check if focused window is Nautilus
+        return focused_result.stdout.strip() in result.stdout.strip().split('\n')
+
+    def _get_active_window(self):
+        """(id, título) de la ventana activa o None (Xlib si está disponible, si no xdotool)"""
+        if _get_xlib_display() is not None:
+            window = _x_active_window()
+            if window is None:
+                return None
+            net_name, wm_name = _x_window_names(window)
+            return str(window.id), net_name or wm_name or ''
+
+        # Get the currently active window
+        result = subprocess.run(
+            ['xdotool', 'getactivewindow'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            stdin=subprocess.DEVNULL,
+            text=True,
+            timeout=2
+        )
+        if result.returncode != 0 or not result.stdout.strip():
+            return None
+        active_window_id = result.stdout.strip()
+
+        # Get the window title to check if it's Nautilus
+        title_result = subprocess.run(
+            ['xdotool', 'getwindowname', active_window_id],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            stdin=subprocess.DEVNULL,
+            text=True,
+            timeout=1
+        )
+        if title_result.returncode != 0:
+            return None
+        return active_window_id, title_result.stdout.strip()
 
     def get_directory_from_active_nautilus_window(self):
         """Get directory from the currently active/focused Nautilus window"""
         try:
-            # Get the currently active window
-            result = subprocess.run(
-                ['xdotool', 'getactivewindow'],
-                capture_output=True,
-                text=True,
-                timeout=2
-            )
-            
-            if result.returncode == 0 and result.stdout.strip():
-                active_window_id = result.stdout.strip()
-                
-                # Get the window title to check if it's Nautilus
-                title_result = subprocess.run(
-                    ['xdotool', 'getwindowname', active_window_id],
-                    capture_output=True,
-                    text=True,
-                    timeout=1
+            active = self._get_active_window()
+            if active:
+                active_window_id, title = active
+                # Check if this looks like a Nautilus window
+                is_nautilus = (
+                    'nautilus' in title.lower() or
+                    title.startswith('/') or
+                    _XDG_FOLDER_TITLE_RE.search(title) is not None or
+                    len(title) > 3 and title not in ['✳ Carpeta problema']  # Exclude our own window titles
                 )
-                
-                if title_result.returncode == 0:
-                    title = title_result.stdout.strip()
-                    # Check if this looks like a Nautilus window
-                    is_nautilus = (
-                        'nautilus' in title.lower() or
-                        title.startswith('/') or
-                        any(folder in title.lower() for folder in ['documents', 'documentos', 'downloads', 'descargas', 'pictures', 'imágenes', 'music', 'música', 'videos', 'vídeos', 'desktop', 'escritorio']) or
-                        len(title) > 3 and title not in ['✳ Carpeta problema']  # Exclude our own window titles
-                    )
 
                 if is_nautilus:
                     # Try to get directory from title
@@ -1667,30 +2503,35 @@ class FloatingButtonApp:
         """Try to get directory from window properties"""
         try:
             # Try to get window properties that might contain the path
-            prop_result = subprocess.run(
-                ['xprop', '-id', window_id, 'WM_NAME', '_NET_WM_NAME'],
-                capture_output=True,
-                text=True,
-                timeout=2
-            )
-            
-            if prop_result.returncode == 0:
-                output = prop_result.stdout
-                
+            xdisplay = _get_xlib_display()
+            if xdisplay is not None:
+                # Leer los títulos con Xlib, entrecomillados como en la salida de xprop
+                window = xdisplay.create_resource_object('window', int(window_id))
+                output = '\n'.join(f'"{name}"' for name in _x_window_names(window) if name)
+            else:
+                prop_result = subprocess.run(
+                    ['xprop', '-id', window_id, 'WM_NAME', '_NET_WM_NAME'],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    stdin=subprocess.DEVNULL,
+                    text=True,
+                    timeout=2
+                )
+                output = prop_result.stdout if prop_result.returncode == 0 else None
+
+            if output:
                 # Look for file paths in the properties
-                import re
-                paths = re.findall(r'["\']([^"\']*file://[^"\']*)["\']', output)
+                paths = _PROP_FILE_RE.findall(output)
                 for path in paths:
                     if 'file://' in path:
-                        from urllib.parse import unquote
                         clean_path = unquote(path.replace('file://', ''))
-                        if os.path.exists(clean_path) and os.path.isdir(clean_path):
+                        if os.path.isdir(clean_path):
                             return clean_path
                 
                 # Look for direct paths
-                paths = re.findall(r'["\']([^"\']*(?:/[^/"\'\s]+)+)["\']', output)
+                paths = _PROP_PATH_RE.findall(output)
                 for path in paths:
-                    if os.path.exists(path) and os.path.isdir(path):
+                    if os.path.isdir(path):
                         return path
             
         except Exception:
@@ -1704,21 +2545,12 @@ class FloatingButtonApp:
         try:
             # Try current working directory first
             cwd = os.getcwd()
-            if os.path.exists(cwd) and os.path.isdir(cwd):
+            if os.path.isdir(cwd):
                 return cwd
             
             # Try common directories
-            home = os.path.expanduser('~')
-            common_dirs = [
-                os.path.join(home, 'Desktop'),
-                os.path.join(home, 'Escritorio'), 
-                os.path.join(home, 'Documents'),
-                os.path.join(home, 'Documentos'),
-                home
-            ]
-            
-            for directory in common_dirs:
-                if os.path.exists(directory) and os.path.isdir(directory):
+            for directory in _FALLBACK_DIRS:
+                if os.path.isdir(directory):
                     return directory
 
         except Exception:
@@ -1748,126 +2580,73 @@ class FloatingButtonApp:
 
         # If it starts with /, it's likely a full path
         if title.startswith('/'):
-            if os.path.exists(title):
+            if _is_dir(title):
                 return title
         
         # Try to find path patterns in the original title
-        import re
-        path_pattern = r'(/[^\s]+(?:/[^\s]*)*?)'
-        matches = re.findall(path_pattern, original_title)
+        matches = _TITLE_PATH_RE.findall(original_title)
         for match in matches:
-            if os.path.exists(match):
+            if _is_dir(match):
                 return match
 
         # Handle common folder names
         if title and title != '':
-            home = os.path.expanduser('~')
-            
-            # Direct folder name mapping
-            folder_mapping = {
-                'Documents': 'Documents', 'Documentos': 'Documents',
-                'Downloads': 'Downloads', 'Descargas': 'Downloads',
-                'Pictures': 'Pictures', 'Imágenes': 'Pictures',
-                'Music': 'Music', 'Música': 'Music',
-                'Videos': 'Videos', 'Vídeos': 'Videos',
-                'Desktop': 'Desktop', 'Escritorio': 'Desktop',
-                'Public': 'Public', 'Público': 'Public',
-                'Templates': 'Templates', 'Plantillas': 'Templates'
-            }
-            
+            home = _USER_HOME
+            title_lower = title.lower()
+
             # Special case for home folder
-            if title.lower() in ['carpeta personal', 'home', 'personal folder']:
+            if title_lower in _HOME_TITLES:
                 return home
-            
+
             # Check for exact matches
-            for display_name, folder_name in folder_mapping.items():
-                if title.lower() == display_name.lower():
-                    path = os.path.join(home, folder_name)
-                    if os.path.exists(path):
-                        return path
-            
+            path = _FOLDER_MAP.get(title_lower)
+            if path:
+                return path
+
             # Check for partial matches
-            for display_name, folder_name in folder_mapping.items():
-                if display_name.lower() in title.lower():
-                    path = os.path.join(home, folder_name)
-                    if os.path.exists(path):
-                        return path
+            for display_name, path in _FOLDER_MAP.items():
+                if display_name in title_lower:
+                    return path
 
-            # Try as subdirectory of home
+            # Try as subdirectory of home (consulta en el índice, sin stat por título)
             if '/' not in title:  # Only if it's a simple name
-                path = os.path.join(home, title)
-                if os.path.exists(path):
+                path = self._get_home_index().get(title.casefold())
+                if path:
                     return path
             
             # Enhanced search for folder names
-            if '/' not in title and title not in ['org.gnome.Nautilus', 'Nautilus']:
+            if '/' not in title and title_lower not in _IGNORED_TITLES:
                 found_path = self.search_folder_by_name(title)
                 if found_path:
                     return found_path
 
         return None
     
+    def _get_home_index(self):
+        """Índice de subcarpetas de home, releído con un solo scandir como mucho cada 30 s"""
+        now = time.monotonic()
+        if now - self._home_index_time > 30.0:
+            try:
+                with os.scandir(_USER_HOME) as entries:
+                    # Se reemplaza el dict entero: el hilo de detección nunca ve uno a medias
+                    self._home_index = {
+                        entry.name.casefold(): entry.path for entry in entries if entry.is_dir()
+                    }
+            except OSError:
+                self._home_index = {}
+            self._home_index_time = now
+        return self._home_index
+
     def search_folder_by_name(self, folder_name):
-        """Search for a folder by name in common locations"""
-        search_locations = [
-            os.path.expanduser('~'),
-            os.path.expanduser('~/Documents'),
-            os.path.expanduser('~/Documentos'),
-            os.path.expanduser('~/Desktop'),
-            os.path.expanduser('~/Escritorio'),
-            os.path.expanduser('~/Downloads'),
-            os.path.expanduser('~/Descargas')
-        ]
-        
-        # First try direct subdirectories
-        for base_dir in search_locations:
-            if os.path.exists(base_dir):
-                try:
-                    for item in os.listdir(base_dir):
-                        if item.lower() == folder_name.lower():
-                            full_path = os.path.join(base_dir, item)
-                            if os.path.isdir(full_path):
-                                return full_path
-                except PermissionError:
-                    continue
-        
-        # Then try deeper search (max 2 levels)
-        for base_dir in search_locations[:3]:  # Only search in home, Documents, Documentos
-            if os.path.exists(base_dir):
-                try:
-                    found = self.recursive_folder_search(base_dir, folder_name, max_depth=2)
-                    if found:
-                        return found
-                except Exception:
-                    continue
-        
-        return None
-    
-    def recursive_folder_search(self, base_dir, target_name, max_depth=2, current_depth=0):
-        """Recursively search for a folder by name"""
-        if current_depth >= max_depth:
-            return None
-            
-        try:
-            for item in os.listdir(base_dir):
-                item_path = os.path.join(base_dir, item)
-                
-                # Check if this item matches our target
-                if os.path.isdir(item_path) and item.lower() == target_name.lower():
-                    return item_path
-                
-                # Recurse into subdirectories
-                if os.path.isdir(item_path) and current_depth < max_depth - 1:
-                    # Skip hidden directories and common system directories
-                    if not item.startswith('.') and item not in ['node_modules', '__pycache__', '.git']:
-                        result = self.recursive_folder_search(item_path, target_name, max_depth, current_depth + 1)
-                        if result:
-                            return result
-        
-        except PermissionError:
-            pass
-        
-        return None
+        """Search for a folder by name in common locations (resultados cacheados hasta 60 s)"""
+        # Caducar la caché entera periódicamente para ver carpetas nuevas o borradas
+        now = time.monotonic()
+        if now - self._folder_cache_time > 60.0:
+            _search_folder.cache_clear()
+            self._folder_cache_time = now
+
+        # Normalizar el nombre buscado una sola vez (casefold cubre nombres como "Música")
+        return _search_folder(folder_name.casefold())
 
     def update_tooltip(self):
         """Update button tooltip with current directory"""
@@ -1895,16 +2674,14 @@ class FloatingButtonApp:
 
 
 class SettingsDialog:
+    _css_provider = None  # Provider compartido por todas las instancias del diálogo
+
     def __init__(self, parent_app):
         self.app = parent_app
 
-        self.dialog = Gtk.Dialog(
-            title="Configuración - VSCode Widget",
-            parent=None,
-            flags=0
-        )
-        self.dialog.set_default_size(400, 300)
-        self.dialog.set_border_width(10)
+        # Construir el diálogo desde la plantilla XML
+        builder = Gtk.Builder.new_from_string(_SETTINGS_UI, -1)
+        self.dialog = builder.get_object('dialog')
 
         # Apply blur effect to settings dialog
         self.apply_dialog_styles()
@@ -1913,95 +2690,30 @@ class SettingsDialog:
         self.dialog.add_button("Cancelar", Gtk.ResponseType.CANCEL)
         self.dialog.add_button("Guardar", Gtk.ResponseType.OK)
 
-        # Content area
-        box = self.dialog.get_content_area()
-        box.set_spacing(10)
-
-        # Title
-        title = Gtk.Label()
-        title.set_markup('<span font="14" weight="bold">⚙️ Configuración</span>')
-        box.pack_start(title, False, False, 10)
+        box = builder.get_object('content_box')
 
         # Editor command
-        editor_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=5)
-        editor_label = Gtk.Label(label="Comando del editor:")
-        editor_label.set_width_chars(20)
-        editor_label.set_xalign(0)
-        self.editor_entry = Gtk.Entry()
+        self.editor_entry = builder.get_object('editor_entry')
         self.editor_entry.set_text(self.app.config.get('editor_command', 'code'))
-        self.editor_entry.set_placeholder_text("code, /usr/bin/code, etc.")
-
-        # Browse button
-        browse_button = Gtk.Button(label="📁")
-        browse_button.set_tooltip_text("Seleccionar ejecutable")
-        browse_button.connect('clicked', self.on_browse_editor)
-
-        editor_box.pack_start(editor_label, False, False, 0)
-        editor_box.pack_start(self.editor_entry, True, True, 0)
-        editor_box.pack_start(browse_button, False, False, 0)
-        box.pack_start(editor_box, False, False, 0)
-
-        # Info label
-        info_label = Gtk.Label()
-        info_label.set_markup('<span font="8" style="italic">💡 Usa "code" o la ruta completa como "/usr/bin/code"</span>')
-        info_label.set_xalign(0)
-        info_label.set_margin_start(20)
-        box.pack_start(info_label, False, False, 0)
+        builder.get_object('browse_button').connect('clicked', self.on_browse_editor)
 
         # Button color
-        color_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
-        color_label = Gtk.Label(label="Color del botón:")
-        color_label.set_width_chars(20)
-        color_label.set_xalign(0)
-        self.color_button = Gtk.ColorButton()
+        self.color_button = builder.get_object('color_button')
         color = Gdk.RGBA()
         color.parse(self.app.config['button_color'])
         self.color_button.set_rgba(color)
-        color_box.pack_start(color_label, False, False, 0)
-        color_box.pack_start(self.color_button, False, False, 0)
-        box.pack_start(color_box, False, False, 0)
 
         # Show label
-        label_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
-        label_label = Gtk.Label(label="Mostrar etiqueta:")
-        label_label.set_width_chars(20)
-        label_label.set_xalign(0)
-        self.show_label_switch = Gtk.Switch()
+        self.show_label_switch = builder.get_object('show_label_switch')
         self.show_label_switch.set_active(self.app.config['show_label'])
-        label_box.pack_start(label_label, False, False, 0)
-        label_box.pack_start(self.show_label_switch, False, False, 0)
-        box.pack_start(label_box, False, False, 0)
 
         # Autostart option
-        autostart_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
-        autostart_label = Gtk.Label(label="Iniciar con el sistema:")
-        autostart_label.set_width_chars(20)
-        autostart_label.set_xalign(0)
-        self.autostart_switch = Gtk.Switch()
+        self.autostart_switch = builder.get_object('autostart_switch')
         # Verificar el estado real del archivo de autostart
         actual_autostart_state = self.check_autostart_enabled()
         self.autostart_switch.set_active(actual_autostart_state)
         # Actualizar el config con el estado real
         self.app.config['autostart'] = actual_autostart_state
-        autostart_box.pack_start(autostart_label, False, False, 0)
-        autostart_box.pack_start(self.autostart_switch, False, False, 0)
-        box.pack_start(autostart_box, False, False, 0)
-
-        # Autostart info
-        autostart_info = Gtk.Label()
-        autostart_info.set_markup('<span font="8" style="italic">💡 El botón aparecerá automáticamente al iniciar sesión</span>')
-        autostart_info.set_xalign(0)
-        autostart_info.set_margin_start(20)
-        box.pack_start(autostart_info, False, False, 0)
-
-        # Info
-        info = Gtk.Label()
-        info.set_markup(
-            '<span font="9" style="italic">💡 Puedes arrastrar el botón flotante\n'
-            'para moverlo a cualquier posición</span>'
-        )
-        info.set_margin_top(20)
-        box.pack_start(info, False, False, 0)
 
         # Current directory info
         if self.app.current_directory:
@@ -2011,28 +2723,10 @@ class SettingsDialog:
             dir_info.set_max_width_chars(50)
             box.pack_start(dir_info, False, False, 0)
 
-        # Credits footer
-        credits_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=2)
-        credits_box.set_margin_top(20)
-
         # Version label
-        version_label = Gtk.Label()
-        version_label.set_markup(f'<span font="7" foreground="#666666">release: {VERSION}</span>')
-        version_label.set_xalign(0.5)
-        credits_box.pack_start(version_label, False, False, 0)
-
-        credits_label = Gtk.Label()
-        credits_label.set_markup('<span font="7" foreground="#888888">Realizado por Konstantin WDK</span>')
-        credits_label.set_xalign(0.5)
-        credits_box.pack_start(credits_label, False, False, 0)
-
-        # Clickable link
-        web_button = Gtk.LinkButton.new_with_label("https://webdesignerk.com", "webdesignerk.com")
-        web_button.set_relief(Gtk.ReliefStyle.NONE)
-        web_button.set_halign(Gtk.Align.CENTER)
-        credits_box.pack_start(web_button, False, False, 0)
-
-        box.pack_end(credits_box, False, False, 0)
+        builder.get_object('version_label').set_markup(
+            f'<span font="7" foreground="#666666">release: {VERSION}</span>'
+        )
 
         self.dialog.show_all()
 
@@ -2045,74 +2739,13 @@ class SettingsDialog:
 
     def apply_dialog_styles(self):
         """Apply modern styles with blur to dialog"""
-        css_provider = Gtk.CssProvider()
-
-        css = """
-        dialog {
-            background: rgba(50, 50, 55, 0.98);
-            border-radius: 12px;
-            border: 1px solid rgba(255, 255, 255, 0.1);
-            box-shadow: 0 10px 40px rgba(0, 0, 0, 0.5);
-        }
-
-        dialog headerbar {
-            background: rgba(60, 60, 65, 0.98);
-            border-radius: 12px 12px 0 0;
-            color: white;
-        }
-
-        dialog headerbar label {
-            color: white;
-        }
-
-        dialog box {
-            background: transparent;
-        }
-
-        dialog entry {
-            border-radius: 6px;
-            padding: 8px;
-            background: rgba(70, 70, 75, 0.9);
-            color: white;
-            border: 1px solid rgba(255, 255, 255, 0.2);
-        }
-
-        dialog entry:focus {
-            border: 1px solid rgba(100, 150, 255, 0.6);
-            box-shadow: 0 0 0 3px rgba(100, 150, 255, 0.2);
-            background: rgba(80, 80, 85, 0.95);
-        }
-
-        dialog button {
-            border-radius: 6px;
-            padding: 8px 16px;
-            background: rgba(70, 70, 75, 0.9);
-            color: white;
-            border: 1px solid rgba(255, 255, 255, 0.2);
-        }
-
-        dialog button:hover {
-            background: rgba(90, 90, 95, 0.95);
-            border: 1px solid rgba(255, 255, 255, 0.3);
-        }
-
-        dialog label {
-            color: #ffffff;
-        }
-
-        dialog switch {
-            background: rgba(70, 70, 75, 0.9);
-        }
-
-        dialog switch:checked {
-            background: rgba(100, 150, 255, 0.8);
-        }
-        """.encode('utf-8')
-
-        css_provider.load_from_data(css)
+        # El CSS del diálogo es estático: se parsea una vez por proceso y se comparte
+        if SettingsDialog._css_provider is None:
+            SettingsDialog._css_provider = Gtk.CssProvider()
+            SettingsDialog._css_provider.load_from_data(_DIALOG_CSS)
 
         style_context = self.dialog.get_style_context()
-        style_context.add_provider(css_provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
+        style_context.add_provider(SettingsDialog._css_provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
 
     def save_settings(self):
         """Save settings and apply changes"""
@@ -2120,7 +2753,7 @@ class SettingsDialog:
         self.app.config['editor_command'] = self.editor_entry.get_text()
 
         rgba = self.color_button.get_rgba()
-        self.app.config['button_color'] = f'#{int(rgba.red*255):02x}{int(rgba.green*255):02x}{int(rgba.blue*255):02x}'
+        self.app.config['button_color'] = _rgba_to_hex(rgba)
 
         self.app.config['show_label'] = self.show_label_switch.get_active()
 
@@ -2133,6 +2766,12 @@ class SettingsDialog:
         else:
             self.disable_autostart()
 
+        # El editor o el PATH pueden haber cambiado: invalidar resoluciones cacheadas
+        _which.cache_clear()
+        validate_editor_command.cache_clear()
+        self.app._resolved_editor = None
+        _search_folder.cache_clear()
+
         # Save to file
         self.app.save_config()
 
@@ -2142,8 +2781,10 @@ class SettingsDialog:
     def check_autostart_enabled(self):
         """Check if autostart is enabled by verifying the .desktop file exists"""
         try:
-            desktop_file = get_autostart_file()
-            return os.path.exists(desktop_file)
+            os.lstat(get_autostart_file())
+            return True
+        except FileNotFoundError:
+            return False
         except Exception as e:
             print(f"Error verificando autostart: {e}")
             return False
@@ -2176,11 +2817,23 @@ Categories=Utility;Development;
 StartupNotify=false
 """
 
-            with open(desktop_file, 'w') as f:
-                f.write(desktop_content)
+            # Nada que escribir si el archivo ya tiene este contenido y es ejecutable
+            try:
+                with open(desktop_file) as f:
+                    if f.read() == desktop_content and os.access(desktop_file, os.X_OK):
+                        return
+            except OSError:
+                pass
 
-            # Make it executable
-            os.chmod(desktop_file, 0o755)
+            fd = os.open(desktop_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o755)
+            try:
+                view = memoryview(desktop_content.encode('utf-8'))
+                while view:
+                    view = view[os.write(fd, view):]
+                # Make it executable (sobre el descriptor: cubre archivos previos y la umask)
+                os.fchmod(fd, 0o755)
+            finally:
+                os.close(fd)
 
             print(f"Autostart habilitado: {desktop_file}")
             if self.app.is_portable:
@@ -2192,10 +2845,10 @@ StartupNotify=false
     def disable_autostart(self):
         """Disable autostart by removing .desktop file"""
         try:
-            desktop_file = get_autostart_file()
-            if os.path.exists(desktop_file):
-                os.remove(desktop_file)
-                print("Autostart deshabilitado")
+            os.remove(get_autostart_file())
+            print("Autostart deshabilitado")
+        except FileNotFoundError:
+            pass
         except Exception as e:
             print(f"Error deshabilitando autostart: {e}")
 
@@ -2247,7 +2900,12 @@ StartupNotify=false
 
 def main():
     app = FloatingButtonApp()
+    # pkill (run.sh, uninstall.sh) envía SIGTERM: salir del bucle para no perder la escritura diferida
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signum, Gtk.main_quit)
     Gtk.main()
+    # Escribir cambios de configuración pendientes
+    app.flush_config()
 
 
 if __name__ == '__main__':